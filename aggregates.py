@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+
+#Return a copy of the paired responses with the revenue column added, leaving the frame passed in untouched
+#Members pay the member price and everyone else, including responses with no membership answer, pays the non-member price.
+#A missing price counts as no revenue
+def addDerivedColumns(df):
+    isMember = df['member'].fillna(False).to_numpy(dtype=bool)
+    price = np.where(isMember, df['memberPrice'].to_numpy(dtype=float), df['nonMemberPrice'].to_numpy(dtype=float))
+    revenue = df['attendees'].to_numpy(dtype=float, na_value=np.nan) * np.nan_to_num(price, nan=0.0)
+    return df.assign(revenue=revenue)
+
+
+#Every chart and summary on the page is built from this cube rather than from the response rows
+CUBE_KEYS = ['eventName', 'member', 'sponsor']
+
+
+#Collapse the paired responses into one row per (event, member flag, sponsor flag) in a single pass over the data
+#Missing member or sponsor answers keep their own cells, so event totals still include those responses
+def buildCube(df):
+    return df.groupby(CUBE_KEYS, dropna=False, observed=True, sort=False).agg(
+        attendees=('attendees', 'sum'),
+        revenue=('revenue', 'sum'),
+        organizations=('eventName', 'size'),
+        firstDate=('date', 'min'),
+        lastDate=('date', 'max'),
+    ).reset_index()
+
+
+#Fold the cube of some newly paired rows into an existing cube, so saving a pairing doesn't regroup every response
+def mergeCubes(cube, newCube):
+    events = cube['eventName'].cat.categories.union(newCube['eventName'].cat.categories)
+    cube = cube.assign(eventName=cube['eventName'].cat.set_categories(events))
+    newCube = newCube.assign(eventName=newCube['eventName'].cat.set_categories(events))
+    return pd.concat([cube, newCube]).groupby(CUBE_KEYS, dropna=False, observed=True, sort=False).agg(
+        attendees=('attendees', 'sum'),
+        revenue=('revenue', 'sum'),
+        organizations=('organizations', 'sum'),
+        firstDate=('firstDate', 'min'),
+        lastDate=('lastDate', 'max'),
+    ).reset_index()
+
+
+#Per event figures for the "Information for Specific Events" section, ordered from the most recent event to the oldest
+#attendees counts every response, members and non-members only the ones that answered the membership question
+def buildEventSummary(cube):
+    summary = cube.groupby('eventName', observed=True).agg(
+        date=('firstDate', 'min'),
+        lastDate=('lastDate', 'max'),
+        organizations=('organizations', 'sum'),
+        attendees=('attendees', 'sum'),
+        revenue=('revenue', 'sum'),
+    )
+    for column, flag in [('members', True), ('nonMembers', False)]:
+        cells = cube[cube['member'].eq(flag).fillna(False)]
+        summary[column] = cells.groupby('eventName', observed=True)['attendees'].sum().reindex(summary.index, fill_value=0)
+    return summary.sort_values('lastDate', ascending=False)
+
+
+#Lower case names of the events in the order of the event summary (most recent first), built once per data version so the event picker
+#can search a long history without lower casing every name on each rerun
+def buildEventIndex(eventSummary):
+    return pd.Series(eventSummary.index.astype(str).str.lower(), index=eventSummary.index.astype(str))
+
+
+#Up to limit event names containing query (ignoring case), most recent first. An empty query matches every event
+def searchEvents(eventIndex, query, limit):
+    query = query.strip().lower()
+    matches = eventIndex.index if not query else eventIndex.index[eventIndex.str.contains(query, regex=False).to_numpy()]
+    return list(matches[:limit])
+
+
+#The k events with the largest total of value, optionally only counting members (True) or non-members (False)
+def topEvents(cube, value, k=5, memberFlag=None):
+    cells = cube if memberFlag is None else cube[cube['member'].eq(memberFlag).fillna(False)]
+    return cells.groupby('eventName', observed=True)[value].sum().nlargest(k).reset_index()
+
+
+#Per event attendance, revenue and first date for the trends chart, split by membership status when byMembership is set
+def trendTable(cube, byMembership=False):
+    keys = ['member', 'eventName'] if byMembership else ['eventName']
+    trend = cube.groupby(keys, observed=True).agg({'attendees': 'sum', 'firstDate': 'min', 'revenue': 'sum'}).reset_index()
+    return trend.rename(columns={'firstDate': 'date'})
+
+
+#Bucket sizes offered by the trends chart. "Event" plots every event on its own date, the others are calendar rollups
+TIME_BUCKETS = {'Event': None, 'Month': 'M', 'Quarter': 'Q', 'Year': 'Y'}
+
+
+#Per bucket size and membership split, the trend rows sorted by date, built once per data version so a window query is a binary search
+#Calendar rollups carry the same bucket's totals from one year earlier for the year over year comparison
+def buildTimeline(cube):
+    timeline = {}
+    for byMembership in (False, True):
+        events = trendTable(cube, byMembership).sort_values('date', kind='stable', ignore_index=True)
+        timeline['Event', byMembership] = events
+        keys = ['member'] if byMembership else []
+        for bucket, freq in TIME_BUCKETS.items():
+            if freq is None:
+                continue
+            periods = events['date'].dt.to_period(freq).dt.start_time.rename('date')
+            rollup = events.groupby(keys + [periods], observed=True).agg(
+                attendees=('attendees', 'sum'),
+                revenue=('revenue', 'sum'),
+                events=('eventName', 'size'),
+            ).reset_index().sort_values('date', kind='stable', ignore_index=True)
+            if not byMembership:
+                previous = rollup.set_index('date').reindex(rollup['date'] - pd.DateOffset(years=1))
+                rollup['previousAttendees'] = previous['attendees'].fillna(0).to_numpy()
+                rollup['previousRevenue'] = previous['revenue'].fillna(0).to_numpy()
+            timeline[bucket, byMembership] = rollup
+    return timeline
+
+
+#Rows of a timeline table dated from start up to and including end, found by binary search on the sorted dates.
+#For calendar rollups start is moved back to the beginning of its bucket, so the bucket it falls in is still shown
+def timeWindow(timeline, bucket, byMembership, start, end=None):
+    table = timeline[bucket, byMembership]
+    start = pd.Timestamp(start)
+    if TIME_BUCKETS[bucket] is not None:
+        start = start.to_period(TIME_BUCKETS[bucket]).start_time
+    dates = table['date'].to_numpy()
+    first = np.searchsorted(dates, start.to_datetime64(), side='left')
+    last = len(dates) if end is None else np.searchsorted(dates, pd.Timestamp(end).to_datetime64(), side='right')
+    return table.iloc[first:last]
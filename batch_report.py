@@ -0,0 +1,76 @@
+#Builds the dashboard's reports for every response workbook in a folder, without Streamlit
+#Run from the repository root with: python batch_report.py responses/ reports/ --years 3
+import argparse
+import datetime
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import pairing_store
+from ingest import loadPairingTable
+from pipeline import loadDataset
+from report import writeReport
+
+
+logger = logging.getLogger(__name__)
+
+WORKBOOK_EXTENSIONS = ('.xlsx', '.xls', '.csv')
+
+
+#Build and write the report for one workbook. Runs in a worker process, so everything it needs is passed in
+def reportWorkbook(path, outputDir, dateNamePairing, pairingVersion, years, today):
+    name = os.path.splitext(os.path.basename(path))[0]
+    dataset = loadDataset(path, dateNamePairing, pairingVersion)
+    writeReport(dataset, outputDir, name, years, today)
+    eventSummary = dataset['eventSummary']
+    return {
+        'workbook': os.path.basename(path),
+        'responses': len(dataset['originalDF']),
+        'pairedResponses': len(dataset['df']),
+        'events': len(eventSummary),
+        'attendees': int(eventSummary['attendees'].sum()),
+        'revenue': float(eventSummary['revenue'].sum()),
+        'unpairedDates': len(dataset['unknownDates']),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write an HTML report and CSV summaries for every response workbook in a folder")
+    parser.add_argument('responses', help="folder of Google Form response workbooks or CSV exports")
+    parser.add_argument('output', help="folder the reports are written to")
+    parser.add_argument('--pairings', help="pairing workbook to use instead of the pairing store")
+    parser.add_argument('--years', type=int, default=3, help="years of events shown in the trend charts")
+    parser.add_argument('--workers', type=int, default=None, help="number of worker processes (defaults to the number of CPUs)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+    #The pairing table is read once here and handed to every worker, so all reports use the same version of it
+    if args.pairings:
+        dateNamePairing, pairingVersion = loadPairingTable(args.pairings), 0
+    else:
+        pairing_store.ensureStore()
+        dateNamePairing, pairingVersion = pairing_store.loadPairingTable()
+
+    paths = sorted(os.path.join(args.responses, name) for name in os.listdir(args.responses) if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith('~$'))
+    today = datetime.date.today()
+    summaries = []
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {executor.submit(reportWorkbook, path, args.output, dateNamePairing, pairingVersion, args.years, today): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except Exception:
+                logger.exception("Could not build the report for %s", futures[future])
+            else:
+                logger.info("Wrote the report for %s", futures[future])
+
+    os.makedirs(args.output, exist_ok=True)
+    summary = pd.DataFrame(summaries, columns=['workbook', 'responses', 'pairedResponses', 'events', 'attendees', 'revenue', 'unpairedDates'])
+    summary.sort_values('workbook').to_csv(os.path.join(args.output, 'summary.csv'), index=False)
+    print(f"Wrote {len(summaries)} of {len(paths)} reports to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#Compares the original row by row findPairings loop against the vectorized pairing engine
+#Run from the repository root with: python benchmarks/bench_pairing.py --sizes 100000 1000000
+import argparse
+import datetime
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ingest import normalizeResponses
+from pairing import pairResponses
+
+
+#The pairing loop as it was written in streamlit_app.py, kept here only as the reference to measure against
+def legacyPairing(originalDF, dateNamePairing):
+    temp_df = originalDF.copy()
+    mappingPairs = {}
+    for ind in dateNamePairing.index:
+        mappingPairs[dateNamePairing.loc[ind]['Date']] = dateNamePairing.loc[ind]
+
+    unknownDates = []
+    eventName = []
+    nonMemberPrice = []
+    memberPrice = []
+    for ind in temp_df.index:
+        date = temp_df.loc[ind]['Timestamp']
+        if date in mappingPairs:
+            eventName.append(mappingPairs[date].iloc[1])
+            nonMemberPrice.append(mappingPairs[date].iloc[2])
+            memberPrice.append(mappingPairs[date].iloc[3])
+        else:
+            if date not in unknownDates:
+                unknownDates.append(date)
+            eventName.append(None)
+            nonMemberPrice.append(None)
+            memberPrice.append(None)
+    temp_df['eventName'] = eventName
+    temp_df['nonMemberPrice'] = nonMemberPrice
+    temp_df['memberPrice'] = memberPrice
+
+    temp_df.dropna(subset=['eventName'], inplace=True)
+    return temp_df, set(unknownDates)
+
+
+#Build a raw responses sheet and a pairing sheet with some unpaired dates, some "no event" dates and some duplicated dates
+def makeData(numResponses, numEvents, seed=0):
+    rng = np.random.default_rng(seed)
+    start = datetime.date(2020, 1, 1)
+    eventDates = [start + datetime.timedelta(days=int(day)) for day in rng.choice(365 * 5, size=numEvents, replace=False)]
+
+    rawResponses = pd.DataFrame({
+        'Timestamp': [pd.Timestamp(eventDates[i]) + pd.Timedelta(hours=9) for i in rng.integers(0, numEvents, size=numResponses)],
+        'Is your organization a sponsor of this event?': rng.choice(['Yes', 'No'], size=numResponses, p=[0.1, 0.9]),
+        'Is your organization a member of the Waltham Chamber of Commerce?': rng.choice(['Yes', 'No', 'Not sure'], size=numResponses, p=[0.6, 0.35, 0.05]),
+        'Number of attendees from your company?': rng.integers(1, 10, size=numResponses),
+    })
+
+    pairedDates = eventDates[: int(numEvents * 0.9)]
+    dateNamePairing = pd.DataFrame({
+        'Date': pairedDates,
+        'Event Name': ['Event ' + str(i) for i in range(len(pairedDates))],
+        'Price for Non-Members': rng.integers(20, 80, size=len(pairedDates)).astype(float),
+        'Price for Members': rng.integers(10, 50, size=len(pairedDates)).astype(float),
+    })
+    dateNamePairing.loc[dateNamePairing.index[::10], ['Event Name', 'Price for Non-Members', 'Price for Members']] = None
+    duplicates = dateNamePairing.iloc[::25].copy()
+    duplicates['Event Name'] = duplicates['Event Name'] + ' (renamed)'
+    dateNamePairing = pd.concat([dateNamePairing, duplicates], ignore_index=True)
+    return rawResponses, dateNamePairing
+
+
+def timeIt(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the response to event pairing step")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100_000, 1_000_000])
+    parser.add_argument('--events', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'responses':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for size in args.sizes:
+        rawResponses, dateNamePairing = makeData(size, args.events)
+
+        #Each version gets its input in the shape it was written for, the old loop on python dates and the new lookup on the compact frame
+        legacyInput = rawResponses.copy()
+        legacyInput['Timestamp'] = legacyInput['Timestamp'].dt.date
+        compactInput = normalizeResponses(rawResponses.copy())
+
+        #The old loop only knew exact dates, so the vectorized side runs without the nearest event window
+        legacyTime, (legacyDF, legacyUnknown) = timeIt(legacyPairing, legacyInput, dateNamePairing)
+        vectorTime, (vectorDF, vectorUnknown) = timeIt(pairResponses, compactInput, dateNamePairing, 0)
+
+        assert legacyDF.index.equals(vectorDF.index)
+        assert legacyDF['eventName'].tolist() == vectorDF['eventName'].astype(object).tolist()
+        np.testing.assert_array_equal(legacyDF['nonMemberPrice'].to_numpy(dtype=float), vectorDF['nonMemberPrice'].to_numpy())
+        np.testing.assert_array_equal(legacyDF['memberPrice'].to_numpy(dtype=float), vectorDF['memberPrice'].to_numpy())
+        assert legacyUnknown == vectorUnknown
+        print(f"{size:>10} {legacyTime:>12.2f} {vectorTime:>15.3f} {legacyTime / vectorTime:>8.0f}x")
+
+if __name__ == '__main__':
+    main()
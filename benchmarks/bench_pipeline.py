@@ -0,0 +1,134 @@
+#Times every stage from workbook to chart on synthetic data, writes the results as JSON and compares them with an earlier run
+#Run from the repository root with: python benchmarks/bench_pipeline.py --sizes 1000 100000 --output bench_results.json --baseline old.json
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+import pandas as pd
+import plotly
+import plotly.io as pio
+
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from aggregates import addDerivedColumns, buildCube, buildEventSummary, buildTimeline, topEvents
+from charts import TOP_EVENT_PIES, TREND_VALUES, topEventsPie, trendChart
+from ingest import normalizeResponses, readResponseSheet
+from pairing import pairResponses
+from synthetic_data import makePairingTable, makeResponses, workbookBytes
+
+
+#Stages are timed in pipeline order, each one on the output of the stage before it
+STAGES = ['parse', 'normalize', 'pairing', 'revenue', 'groupbys', 'figures']
+
+#Stages faster than this are left out of the regression check, since their timings are mostly noise
+MIN_CHECKED_SECONDS = 0.005
+
+
+def groupbys(df):
+    cube = buildCube(df)
+    tables = [buildEventSummary(cube), buildTimeline(cube)]
+    tables += [topEvents(cube, value, memberFlag=memberFlag) for _, value, _, _, memberFlag in TOP_EVENT_PIES]
+    return cube, tables
+
+
+def figures(cube, timeline, today):
+    charts = [topEventsPie(cube, value, title, valueLabel, memberFlag) for _, value, title, valueLabel, memberFlag in TOP_EVENT_PIES]
+    return charts + [trendChart(timeline, selected_value, 3, today) for selected_value in TREND_VALUES]
+
+
+#Run function repeats times and return its timings along with the result of the last run
+def timeStage(repeats, function, *args):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def benchmarkSize(size, events, repeats, seed):
+    rawResponses = makeResponses(size, events, seed)
+    dateNamePairing = makePairingTable(rawResponses, seed)
+    dateNamePairing['Date'] = pd.to_datetime(dateNamePairing['Date']).dt.date
+    fileBytes = workbookBytes(rawResponses, 'Form Responses 1')
+    #The synthetic data ends in 2024, so the trend window is measured from the end of it rather than from today
+    today = rawResponses['Timestamp'].max().date()
+
+    timings = {}
+    timings['parse'], raw = timeStage(repeats, readResponseSheet, fileBytes)
+    timings['normalize'], originalDF = timeStage(repeats, lambda: normalizeResponses(raw.copy()))
+    timings['pairing'], (paired, _) = timeStage(repeats, pairResponses, originalDF, dateNamePairing)
+    timings['revenue'], df = timeStage(repeats, addDerivedColumns, paired)
+    timings['groupbys'], (cube, tables) = timeStage(repeats, groupbys, df)
+    timings['figures'], charts = timeStage(repeats, figures, cube, tables[1], today)
+    #Bytes of the chart specs the dashboard would send to the browser, so the point budget can be checked along with the timings
+    payloadBytes = sum(len(pio.to_json(chart, validate=False)) for chart in charts)
+
+    return [
+        {'size': size, 'events': events, 'stage': stage, 'seconds': min(timings[stage]), 'median': statistics.median(timings[stage]), 'repeats': repeats}
+        | ({'payloadBytes': payloadBytes} if stage == 'figures' else {})
+        for stage in STAGES
+    ]
+
+
+#Every (size, stage) that got more than tolerance slower than in the baseline run
+def findRegressions(results, baseline, tolerance):
+    previous = {(row['size'], row['stage']): row['seconds'] for row in baseline['results']}
+    regressions = []
+    for row in results:
+        before = previous.get((row['size'], row['stage']))
+        if before is None or max(before, row['seconds']) < MIN_CHECKED_SECONDS:
+            continue
+        if row['seconds'] > before * (1 + tolerance):
+            regressions.append(dict(row, baseline=before, ratio=row['seconds'] / before))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the ingest to chart pipeline")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json', help="where the machine readable results are written")
+    parser.add_argument('--baseline', help="results file of an earlier run to check for regressions against")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown over the baseline, 0.2 being 20%%")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'responses':>10} " + ' '.join(f"{stage:>10}" for stage in STAGES))
+    for size in args.sizes:
+        rows = benchmarkSize(size, args.events, args.repeats, args.seed)
+        results += rows
+        print(f"{size:>10} " + ' '.join(f"{row['seconds']:>9.3f}s" for row in rows) + f"  {rows[-1]['payloadBytes'] / 1e3:.0f} KB of charts")
+
+    report = {
+        'createdAt': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plotly': plotly.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    }
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = findRegressions(results, json.load(file), args.tolerance)
+        for row in regressions:
+            print(f"Regression: {row['stage']} at {row['size']} responses took {row['seconds']:.3f}s, was {row['baseline']:.3f}s ({row['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against " + args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#Compares the original row by row Revenue apply() against the array based addDerivedColumns, including missing prices and membership answers
+#Run from the repository root with: python benchmarks/bench_revenue.py --sizes 100000 1000000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from aggregates import addDerivedColumns
+from schema import FIELD_DTYPES
+
+
+MEMBER_HEADER = 'Is your organization a member of the Waltham Chamber of Commerce?'
+ATTENDEES_HEADER = 'Number of attendees from your company?'
+
+
+#The Revenue apply() as it was written in streamlit_app.py, kept here only as the reference to measure against
+def legacyRevenue(df):
+    return df.apply(lambda row: row[ATTENDEES_HEADER] * row['memberPrice']
+                            if row[MEMBER_HEADER] == True
+                            else row[ATTENDEES_HEADER] * row['nonMemberPrice'], axis=1)
+
+
+#Build paired responses in the compact schema, with some missing prices and some membership answers that were neither yes nor no,
+#and the same rows in the shape the old code saw them: raw headers, and True/False/NaN member flags from its yes/no map
+def makeData(numResponses, numEvents, seed=0):
+    rng = np.random.default_rng(seed)
+    nonMemberPrices = rng.integers(20, 80, size=numEvents).astype(float)
+    memberPrices = rng.integers(10, 50, size=numEvents).astype(float)
+    nonMemberPrices[::7] = np.nan
+    memberPrices[::5] = np.nan
+    events = rng.integers(0, numEvents, size=numResponses)
+    answers = rng.choice(['yes', 'no', 'not sure'], size=numResponses, p=[0.6, 0.3, 0.1])
+
+    compact = pd.DataFrame({
+        'member': pd.Series(answers).map({'yes': True, 'no': False}).astype(FIELD_DTYPES['member']),
+        'attendees': pd.Series(rng.integers(1, 10, size=numResponses)).astype(FIELD_DTYPES['attendees']),
+        'eventName': pd.Series(['Event ' + str(event) for event in events]).astype(FIELD_DTYPES['eventName']),
+        'nonMemberPrice': nonMemberPrices[events],
+        'memberPrice': memberPrices[events],
+    })
+    legacy = pd.DataFrame({
+        MEMBER_HEADER: pd.Series(answers).map({'yes': True, 'no': False}),
+        ATTENDEES_HEADER: compact['attendees'].to_numpy(dtype=int),
+        'eventName': compact['eventName'].astype(object),
+        'nonMemberPrice': compact['nonMemberPrice'],
+        'memberPrice': compact['memberPrice'],
+    })
+    return compact, legacy
+
+
+def timeIt(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the revenue step and check it against the old apply()")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    parser.add_argument('--events', type=int, default=300)
+    args = parser.parse_args()
+
+    print(f"{'responses':>10} {'legacy (s)':>12} {'vectorized (s)':>15} {'speedup':>9}")
+    for size in args.sizes:
+        compact, legacy = makeData(size, args.events)
+
+        legacyTime, legacyValues = timeIt(legacyRevenue, legacy)
+        vectorTime, derived = timeIt(addDerivedColumns, compact)
+
+        #The old code left a missing price as NaN revenue, which the per event sums then skipped, so it counts as 0 here
+        np.testing.assert_allclose(derived['revenue'].to_numpy(), np.nan_to_num(legacyValues.to_numpy(dtype=float), nan=0.0))
+        legacySums = legacy.assign(Revenue=legacyValues).groupby('eventName')['Revenue'].sum()
+        vectorSums = derived.groupby('eventName', observed=True)['revenue'].sum()
+        np.testing.assert_allclose(vectorSums.reindex(legacySums.index).to_numpy(), legacySums.to_numpy())
+        assert 'revenue' not in compact.columns
+        print(f"{size:>10} {legacyTime:>12.2f} {vectorTime:>15.4f} {legacyTime / vectorTime:>8.0f}x")
+
+if __name__ == '__main__':
+    main()
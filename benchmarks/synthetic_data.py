@@ -0,0 +1,95 @@
+#Writes synthetic "Form Responses 1" workbooks and matching pairing tables for load testing and benchmarks
+#Run from the repository root with: python benchmarks/synthetic_data.py --responses 1000 100000 --events 300 --output synthetic/
+import argparse
+import datetime
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+
+EVENT_THEMES = [
+    'Business Expo', 'Networking Night', 'Breakfast Forum', 'Lunch & Learn', 'Holiday Gala', 'Golf Tournament',
+    'Economic Outlook', 'Women in Business', 'Young Professionals Mixer', 'Ribbon Cutting', 'Community Fair', 'Tech Talk',
+]
+
+#Share of the event dates that have no row in the pairing table, so the dashboard asks about them
+UNPAIRED_SHARE = 0.1
+
+
+#Build a raw responses sheet spread over numEvents event days. Organizations keep the same membership answer across events,
+#a few answers are "Not sure" or blank, and the timestamps fall during the day of the event like real form submissions
+def makeResponses(numResponses, numEvents, seed=0, numOrganizations=None, start=datetime.date(2020, 1, 1), years=5):
+    rng = np.random.default_rng(seed)
+    numOrganizations = numOrganizations or max(50, numResponses // 20)
+    eventDays = np.sort(rng.choice(365 * years, size=numEvents, replace=False))
+    eventDates = pd.Timestamp(start) + pd.to_timedelta(eventDays, unit='D')
+
+    organizationMember = rng.choice(np.array(['Yes', 'No', 'Not sure', None], dtype=object), size=numOrganizations, p=[0.6, 0.34, 0.04, 0.02])
+    #A handful of popular events draw most of the responses
+    eventWeights = rng.pareto(1.5, size=numEvents) + 1
+    event = rng.choice(numEvents, size=numResponses, p=eventWeights / eventWeights.sum())
+    organization = rng.integers(0, numOrganizations, size=numResponses)
+
+    rawResponses = pd.DataFrame({
+        'Timestamp': eventDates[event] + pd.to_timedelta(rng.integers(7 * 3600, 20 * 3600, size=numResponses), unit='s'),
+        'What is the name of your organization?': pd.Series(organization).map(lambda index: 'Org ' + str(index)),
+        'Is your organization a member of the Waltham Chamber of Commerce?': organizationMember[organization],
+        'Is your organization a sponsor of this event?': rng.choice(['Yes', 'No'], size=numResponses, p=[0.08, 0.92]),
+        'Number of attendees from your company?': rng.integers(1, 10, size=numResponses),
+    })
+    return rawResponses.sort_values('Timestamp', ignore_index=True)
+
+
+#Build the pairing table for the event days in rawResponses, leaving some days unpaired, marking some as "no event"
+#and appending renamed duplicates of a few days the way re-saved pairings show up in the sheet
+def makePairingTable(rawResponses, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    eventDates = np.unique(rawResponses['Timestamp'].dt.normalize())
+    pairedDates = rng.permutation(eventDates)[: int(round(len(eventDates) * (1 - UNPAIRED_SHARE)))]
+    themes = rng.choice(EVENT_THEMES, size=len(pairedDates))
+
+    nonMemberPrice = rng.integers(4, 16, size=len(pairedDates)) * 5.0
+
+    dateNamePairing = pd.DataFrame({
+        'Date': pd.DatetimeIndex(pairedDates).date,
+        'Event Name': [theme + ' ' + str(pd.Timestamp(date).year) + ' #' + str(index) for index, (theme, date) in enumerate(zip(themes, pairedDates))],
+        'Price for Non-Members': nonMemberPrice,
+        'Price for Members': nonMemberPrice - rng.integers(1, 4, size=len(pairedDates)) * 5.0,
+    })
+    dateNamePairing.loc[dateNamePairing.index[::20], ['Event Name', 'Price for Non-Members', 'Price for Members']] = None
+    duplicates = dateNamePairing.iloc[1::25].dropna().copy()
+    duplicates['Event Name'] = duplicates['Event Name'] + ' (renamed)'
+    return pd.concat([dateNamePairing, duplicates], ignore_index=True)
+
+
+#Serialize a sheet to xlsx bytes in the layout the dashboard expects
+def workbookBytes(frame, sheetName):
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+        frame.to_excel(writer, sheet_name=sheetName, index=False)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic response workbooks and pairing tables")
+    parser.add_argument('--responses', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--events', type=int, default=300)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='synthetic')
+    args = parser.parse_args()
+
+    os.makedirs(args.output, exist_ok=True)
+    for size in args.responses:
+        rawResponses = makeResponses(size, args.events, args.seed)
+        dateNamePairing = makePairingTable(rawResponses, args.seed)
+        for name, frame, sheetName in [('responses', rawResponses, 'Form Responses 1'), ('pairings', dateNamePairing, 'Sheet1')]:
+            path = os.path.join(args.output, f"{name}-{size}.xlsx")
+            with open(path, 'wb') as file:
+                file.write(workbookBytes(frame, sheetName))
+            print(f"Wrote {path} ({len(frame)} rows)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+import re
+
+import pandas as pd
+from ics import Calendar
+
+import pairing_store
+from pairing_store import XLSX_COLUMNS
+from parse_cache import readSourceBytes
+
+
+#Prices are read from the event description, with the label either before the amount ("Members: $25, Non-Members: $40")
+#or after it ("Free for members, $20 for non-members"). Without member labels a single "Price: $30" (or "free") is used for both
+PRICE_TOKENS = re.compile(
+    r'(?P<label>\bnon[\s-]*members?\b|\bmembers?\b)(?:\s*:\s*(?P<labelAmount>\d+(?:\.\d+)?)\b)?'
+    r'|\$\s*(?P<amount>\d+(?:\.\d+)?)'
+    r'|(?P<free>\bfree\b)',
+    re.IGNORECASE,
+)
+SINGLE_PRICE = re.compile(r'\b(?:price|cost|admission|tickets?)\b[^$\d\n]*\$?\s*(\d+(?:\.\d+)?)', re.IGNORECASE)
+FREE = re.compile(r'\bfree\b', re.IGNORECASE)
+
+
+#Member labels and prices in the order they appear, as ('member' or 'nonMember', None) and (None, price)
+def _priceTokens(text):
+    tokens = []
+    for match in PRICE_TOKENS.finditer(text):
+        if match['label']:
+            tokens.append(('nonMember' if match['label'].lower().startswith('non') else 'member', None))
+            if match['labelAmount']:
+                tokens.append((None, float(match['labelAmount'])))
+        else:
+            tokens.append((None, 0.0 if match['free'] else float(match['amount'])))
+    return tokens
+
+
+#The prices given for each label, or None when the description has no member labels.
+#When the description starts with a label, a price belongs to the labels right before it, otherwise each label takes the price right before it.
+#A price that can't be tied to a label makes the whole description ambiguous, and then no price is read at all
+def _labeledPrices(text):
+    tokens = _priceTokens(text)
+    if not any(label for label, _ in tokens):
+        return None
+    prices = {'member': set(), 'nonMember': set()}
+    if tokens[0][0] is not None:
+        pending = []
+        for label, price in tokens:
+            if label is not None:
+                pending.append(label)
+            elif not pending:
+                return {}
+            else:
+                for pendingLabel in pending:
+                    prices[pendingLabel].add(price)
+                pending = []
+    else:
+        last, attached = None, True
+        for label, price in tokens:
+            if label is None:
+                if not attached:
+                    return {}
+                last, attached = price, False
+            elif last is not None:
+                prices[label].add(last)
+                attached = True
+        if not attached:
+            return {}
+    #A label given two different prices is ambiguous too
+    return {label: values.pop() for label, values in prices.items() if len(values) == 1}
+
+
+#(non-member price, member price) from an event description. A price that isn't given, or can't be read unambiguously, is left missing
+def eventPrices(description):
+    text = description or ''
+    labeled = _labeledPrices(text)
+    if labeled is not None:
+        return labeled.get('nonMember'), labeled.get('member')
+    single = None
+    match = SINGLE_PRICE.search(text)
+    if match:
+        single = float(match.group(1))
+    elif FREE.search(text):
+        single = 0.0
+    return single, single
+
+
+#Every event of an ICS calendar as pairing rows (Date, Event Name, Price for Non-Members, Price for Members), one pass over the file.
+#Only the first event of a day is kept, since responses are paired by date
+def parseCalendar(text):
+    rows = []
+    for event in Calendar(text).events:
+        if event.begin is None or not event.name:
+            continue
+        nonMemberPrice, memberPrice = eventPrices(event.description)
+        rows.append((event.begin.datetime, event.begin.date(), event.name.strip(), nonMemberPrice, memberPrice))
+
+    events = pd.DataFrame(rows, columns=['begin'] + XLSX_COLUMNS).sort_values('begin', kind='stable')
+    events = events.drop_duplicates(subset='Date', keep='first').drop(columns='begin').reset_index(drop=True)
+    events['Price for Non-Members'] = pd.to_numeric(events['Price for Non-Members'])
+    events['Price for Members'] = pd.to_numeric(events['Price for Members'])
+    return events
+
+
+#The events whose member and non-member prices could both be read. The others are left out of the store, so their dates stay unpaired
+#and the form still asks for them, rather than being stored without prices and counting their responses as no revenue
+def pricedEvents(events):
+    return events.dropna(subset=['Price for Non-Members', 'Price for Members'])
+
+
+#Import the events of one or more ICS files (uploads or paths) into the pairing store in a single transaction.
+#Returns (events found, pairings added, events left out for missing prices, new store version). Dates that already have a pairing keep it
+def importCalendars(sources, dbPath=None):
+    events = pd.concat([parseCalendar(readSourceBytes(source).decode('utf-8')) for source in sources], ignore_index=True)
+    events = events.drop_duplicates(subset='Date', keep='first')
+    priced = pricedEvents(events)
+    #A calendar can be imported before anything is uploaded, and the store is only seeded from DateNamePairings.xlsx while it is empty
+    pairing_store.ensureStore(dbPath=dbPath)
+    added, version = pairing_store.addPairings(priced, dbPath)
+    return len(events), added, len(events) - len(priced), version
@@ -0,0 +1,96 @@
+import datetime
+import os
+
+import plotly.express as px
+
+from aggregates import TIME_BUCKETS, timeWindow, topEvents
+
+
+#Value types offered by the "Recent Event Trends" section
+TREND_VALUES = ["Total Event Revenue", "Total Attendance Numbers"]
+
+#The top performer pies as (chart key, value, title, value label, member flag), in the order the dashboard shows them
+TOP_EVENT_PIES = [
+    ('topRevenuePie', 'revenue', 'Top 5 Events by Revenue', 'Revenue ($)', None),
+    ('topAttendancePie', 'attendees', 'Top 5 Events by Attendance', 'Number of Attendees', None),
+    ('topMembersPie', 'attendees', 'Top 5 Events by Members', 'Number of Members', True),
+    ('topNonMembersPie', 'attendees', 'Top 5 Events by Non - Members', 'Number of Non - Members', False),
+]
+
+#Title prefix for each calendar bucket of the trends chart
+BUCKET_TITLES = {'Month': 'Monthly', 'Quarter': 'Quarterly', 'Year': 'Yearly'}
+
+#Most bars the trends chart sends to the browser. A window holding more than this is rolled up into the finest calendar bucket that fits
+MAX_CHART_POINTS = int(os.environ.get('WCC_CHART_MAX_POINTS', 400))
+
+#Most events the event picker lists at once. Longer histories get a search box, and only the most recent matching events are listed
+MAX_EVENT_OPTIONS = int(os.environ.get('WCC_EVENT_OPTIONS', 100))
+
+
+#Pie chart of the 5 events with the largest total of value, optionally only counting members (True) or non-members (False)
+def topEventsPie(cube, value, title, valueLabel, memberFlag=None):
+    return px.pie(
+        topEvents(cube, value, memberFlag=memberFlag),
+        names='eventName',
+        values=value,
+        title=title,
+        labels={value: valueLabel, 'eventName': 'Event Name'},
+    )
+
+
+#The bucket the trends chart is drawn with: the one asked for, or the finest coarser one whose window fits in MAX_CHART_POINTS bars.
+#A comparison draws two bars per bucket, this year's and the year before's. The window lookups are binary searches, so this is cheap enough to call on every rerun
+def trendBucket(timeline, selected_value, years, today, bucket='Event', compare=False, budget=MAX_CHART_POINTS):
+    compare = compare and bucket != 'Event'
+    byMembership = selected_value == "Total Attendance Numbers" and not compare
+    barsPerRow = 2 if compare else 1
+    years_ago = today - datetime.timedelta(days=365*years)
+    buckets = list(TIME_BUCKETS)
+    for candidate in buckets[buckets.index(bucket):]:
+        if len(timeWindow(timeline, candidate, byMembership, years_ago)) * barsPerRow <= budget:
+            return candidate
+    return buckets[-1]
+
+
+#Bar chart of event revenue or attendance (split by membership) over the given number of years before today,
+#one bar per event or per calendar bucket. With compare set, each bucket is shown next to the same bucket a year earlier.
+#Windows with more bars than MAX_CHART_POINTS are rolled up into a coarser bucket before the figure is built
+def trendChart(timeline, selected_value, years, today, bucket='Event', compare=False):
+    y_axis_years = "revenue" if selected_value == "Total Event Revenue" else "attendees"
+    compare = compare and bucket != 'Event'
+    byMembership = selected_value == "Total Attendance Numbers" and not compare
+    bucket = trendBucket(timeline, selected_value, years, today, bucket, compare)
+
+    # Only the rows dated within the given number of years before today are read
+    years_ago = today - datetime.timedelta(days=365*years)
+    past_years = timeWindow(timeline, bucket, byMembership, years_ago).copy()
+    prefix = "" if bucket == 'Event' else BUCKET_TITLES[bucket] + " "
+    labels = {
+        "revenue": "Revenue",
+        "attendees": "Number of Attendees",
+        "member": "Membership Status",
+        "date": "Event Date" if bucket == 'Event' else bucket,
+        "eventName": "Event Name",
+        "events": "Events",
+    }
+
+    if compare:
+        previous = "previousRevenue" if y_axis_years == "revenue" else "previousAttendees"
+        comparison = past_years[["date", y_axis_years, previous]].rename(columns={y_axis_years: "This Year", previous: "Year Before"})
+        comparison = comparison.melt(id_vars=["date"], var_name="period", value_name=y_axis_years)
+        title = prefix + ("Revenue" if y_axis_years == "revenue" else "Attendance") + " Compared With the Year Before"
+        return px.bar(comparison, x="date", y=y_axis_years, color="period", barmode="group", title=title, labels=dict(labels, period="Period"))
+
+    if byMembership:
+        past_years["member"] = past_years["member"].astype(str).str.lower().map({"true": 'Member', "false": 'Not a Member'})
+    hover_data = ["eventName"] if bucket == 'Event' else ["events"]
+
+    if selected_value == "Total Attendance Numbers":
+        barChart = px.bar(past_years, x="date", color = "member", y=y_axis_years, title=prefix + "Attendance by Membership Status", hover_data=hover_data, labels=labels)
+    else:
+        barChart = px.bar(past_years, x="date", y=y_axis_years, title = prefix + "Revenue From " +str(years) + " Years of Events", hover_data=hover_data, labels=labels)
+
+    if bucket == 'Event':
+        #Single event dates are too thin to see on a multi year axis, so widen them with the length of the window
+        barChart.update_traces(width=100000000*years)
+    return barChart
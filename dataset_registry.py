@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+#Datasets are shared by every session of this server process, keyed by (content hash of the upload, pairing table version).
+#Each session holds a lease on the dataset it is looking at. A lease that hasn't been touched for IDLE_SECONDS is treated as
+#an abandoned session, and a dataset with no remaining leases is released
+IDLE_SECONDS = int(os.environ.get('WCC_DATASET_IDLE_SECONDS', 60 * 60))
+
+_lock = threading.Lock()
+_entries = {}
+
+#How often a session waiting for another session's build checks whether it should stop waiting
+WAIT_POLL_SECONDS = 0.25
+
+#Functions called with the key of every dataset the registry releases, so caches built from it can be dropped too
+releaseListeners = []
+
+
+def datasetKey(contentHash, pairingVersion):
+    return (contentHash, pairingVersion)
+
+
+#Drop leases from sessions that have gone quiet, then every dataset nobody holds a lease on. Must be called with _lock held
+def _evictIdle(now):
+    for key, entry in list(_entries.items()):
+        for sessionId, lastSeen in list(entry['leases'].items()):
+            if now - lastSeen > IDLE_SECONDS:
+                del entry['leases'][sessionId]
+        if not entry['leases'] and entry['ready'].is_set():
+            logger.info("Releasing dataset %s", key)
+            del _entries[key]
+            for listener in releaseListeners:
+                listener(key)
+
+
+#Take a lease on the dataset for key, calling build() to create it if no other session has yet.
+#Sessions asking for a dataset that is still being built wait for that build instead of starting their own.
+#While waiting, onWait() is called every WAIT_POLL_SECONDS. If it raises, the lease is dropped and the exception passed on
+def acquire(key, sessionId, build, onWait=None):
+    with _lock:
+        now = time.monotonic()
+        _evictIdle(now)
+        entry = _entries.get(key)
+        isBuilder = entry is None
+        if isBuilder:
+            entry = _entries[key] = {'dataset': None, 'error': None, 'ready': threading.Event(), 'leases': {}}
+        entry['leases'][sessionId] = now
+
+    if isBuilder:
+        try:
+            entry['dataset'] = build()
+        except BaseException as error:
+            entry['error'] = error
+            with _lock:
+                _entries.pop(key, None)
+            raise
+        finally:
+            entry['ready'].set()
+    else:
+        if onWait is None:
+            entry['ready'].wait()
+        while not entry['ready'].is_set():
+            try:
+                onWait()
+            except BaseException:
+                release(key, sessionId)
+                raise
+            entry['ready'].wait(WAIT_POLL_SECONDS)
+        if entry['error'] is not None:
+            raise entry['error']
+    return entry['dataset']
+
+
+#Return the dataset for key and refresh the session's lease, or None if it has been released in the meantime
+def get(key, sessionId):
+    with _lock:
+        now = time.monotonic()
+        entry = _entries.get(key)
+        if entry is None or not entry['ready'].is_set() or entry['error'] is not None:
+            return None
+        entry['leases'][sessionId] = now
+        _evictIdle(now)
+        return entry['dataset']
+
+
+def release(key, sessionId):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            entry['leases'].pop(sessionId, None)
+        _evictIdle(time.monotonic())
+
+
+#Move a session from one dataset to the next version of it. Other sessions reading the old version keep it until they release it
+def publish(oldKey, newKey, sessionId, build):
+    dataset = acquire(newKey, sessionId, build)
+    if oldKey != newKey:
+        release(oldKey, sessionId)
+    return dataset
+
+
+def registryStats():
+    with _lock:
+        return {'datasets': len(_entries), 'leases': sum(len(entry['leases']) for entry in _entries.values())}
@@ -0,0 +1,247 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urljoin
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import pairing_store
+from calendar_import import eventPrices, pricedEvents
+from pairing_store import XLSX_COLUMNS
+
+
+logger = logging.getLogger(__name__)
+
+#Pages of the chamber's events listing to fetch, separated by spaces. Pages they link to with rel="next" are fetched as well
+EVENTS_URLS = os.environ.get('WCC_EVENTS_URLS', '').split()
+
+#Fetched pages are kept in this folder with their ETag and Last-Modified headers, so unchanged pages come back as a 304 with no body
+CACHE_DIR = os.environ.get('WCC_HTTP_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'http'))
+
+WORKERS = int(os.environ.get('WCC_FETCH_WORKERS', 4))
+TIMEOUT_SECONDS = 15
+MAX_PAGES = 50
+
+#lxml is much faster than the parser built into python, which is still used when lxml isn't installed
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='events-fetch')
+_lock = threading.Lock()
+_status = {'state': 'idle', 'pages': 0, 'notModified': 0, 'failedPages': 0, 'events': 0, 'added': 0, 'unpriced': 0, 'version': None, 'error': None}
+
+
+#One session per fetch, with a connection pool as large as the number of workers and retries on transient errors
+def pooledSession(workers=WORKERS):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504]))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = 'WCC-Visualizations events fetcher'
+    return session
+
+
+def _cachePaths(url, cacheDir):
+    name = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(cacheDir, name + '.json'), os.path.join(cacheDir, name + '.html')
+
+
+#Fetch a page, sending the validators of the cached copy so the server can answer 304 Not Modified.
+#Returns (html, fromCache)
+def fetchPage(session, url, cacheDir=CACHE_DIR):
+    metaPath, bodyPath = _cachePaths(url, cacheDir)
+    meta = {}
+    if os.path.exists(metaPath) and os.path.exists(bodyPath):
+        with open(metaPath) as file:
+            meta = json.load(file)
+
+    headers = {}
+    if meta.get('etag'):
+        headers['If-None-Match'] = meta['etag']
+    if meta.get('lastModified'):
+        headers['If-Modified-Since'] = meta['lastModified']
+
+    response = session.get(url, headers=headers, timeout=TIMEOUT_SECONDS)
+    if response.status_code == 304 and meta:
+        with open(bodyPath, encoding='utf-8') as file:
+            return file.read(), True
+    response.raise_for_status()
+
+    os.makedirs(cacheDir, exist_ok=True)
+    #Write the body before the validators, so a cached ETag always has its page next to it
+    temporaryPath = bodyPath + '.' + str(threading.get_ident()) + '.tmp'
+    with open(temporaryPath, 'w', encoding='utf-8') as file:
+        file.write(response.text)
+    os.replace(temporaryPath, bodyPath)
+    with open(metaPath, 'w') as file:
+        json.dump({'url': url, 'etag': response.headers.get('ETag'), 'lastModified': response.headers.get('Last-Modified')}, file)
+    return response.text, False
+
+
+#The price of a schema.org offer, 0 when it says "free" and missing when it isn't a number, such as "TBD"
+def _offerPrice(value):
+    text = str(value).replace('$', '').replace(',', '').strip()
+    try:
+        return float(text)
+    except ValueError:
+        return 0.0 if text.lower() == 'free' else None
+
+
+def _offerPrices(offers):
+    offers = offers if isinstance(offers, list) else [offers]
+    nonMemberPrice = memberPrice = single = None
+    for offer in offers:
+        if not isinstance(offer, dict) or offer.get('price') in (None, ''):
+            continue
+        price = _offerPrice(offer['price'])
+        if price is None:
+            continue
+        name = str(offer.get('name', '')).lower()
+        if 'non' in name:
+            nonMemberPrice = price
+        elif 'member' in name:
+            memberPrice = price
+        else:
+            single = price
+    if nonMemberPrice is None and memberPrice is None:
+        return single, single
+    return nonMemberPrice, memberPrice
+
+
+def _eventRow(name, start, description='', offers=None):
+    date = pd.to_datetime(start, errors='coerce', utc=False)
+    if not name or pd.isna(date):
+        return None
+    nonMemberPrice, memberPrice = _offerPrices(offers) if offers else (None, None)
+    if nonMemberPrice is None and memberPrice is None:
+        nonMemberPrice, memberPrice = eventPrices(description)
+    return (date.date(), ' '.join(str(name).split()), nonMemberPrice, memberPrice)
+
+
+def _jsonLdItems(data):
+    if isinstance(data, list):
+        for item in data:
+            yield from _jsonLdItems(item)
+    elif isinstance(data, dict):
+        if '@graph' in data:
+            yield from _jsonLdItems(data['@graph'])
+        types = data.get('@type', [])
+        if 'Event' in (types if isinstance(types, list) else [types]) or str(types).endswith('Event'):
+            yield data
+
+
+#Events on a listing page, read from schema.org JSON-LD or microdata, or from h-event microformats, plus the url of the next page if there is one
+def parseEventsPage(html, url=''):
+    soup = BeautifulSoup(html, HTML_PARSER)
+    rows = []
+
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or '')
+        except ValueError:
+            continue
+        for item in _jsonLdItems(data):
+            rows.append(_eventRow(item.get('name'), item.get('startDate'), item.get('description', ''), item.get('offers')))
+
+    for element in soup.select('[itemtype*="schema.org/Event"]'):
+        name = element.select_one('[itemprop="name"]')
+        start = element.select_one('[itemprop="startDate"]')
+        description = element.select_one('[itemprop="description"]')
+        if name is not None and start is not None:
+            rows.append(_eventRow(name.get_text(), start.get('content') or start.get('datetime') or start.get_text(), description.get_text() if description else ''))
+
+    for element in soup.select('.h-event'):
+        name = element.select_one('.p-name')
+        start = element.select_one('.dt-start')
+        if name is not None and start is not None:
+            rows.append(_eventRow(name.get_text(), start.get('datetime') or start.get_text(), element.get_text(' ')))
+
+    nextLink = soup.find(['a', 'link'], rel='next')
+    nextUrl = urljoin(url, nextLink['href']) if nextLink is not None and nextLink.get('href') else None
+    events = pd.DataFrame([row for row in rows if row is not None], columns=XLSX_COLUMNS)
+    return events.drop_duplicates(subset='Date', keep='first'), nextUrl
+
+
+#Fetch the listing pages concurrently, following next links, and add the events of each page to the pairing store as soon as it is parsed.
+#Returns the totals for the run; onPage(totals) is called after every page
+def fetchEvents(urls, cacheDir=CACHE_DIR, dbPath=None, workers=WORKERS, onPage=None):
+    totals = {'pages': 0, 'notModified': 0, 'failedPages': 0, 'events': 0, 'added': 0, 'unpriced': 0, 'version': None}
+    seen = set(urls)
+    #A fetch can run before anything is uploaded, and the store is only seeded from DateNamePairings.xlsx while it is empty
+    pairing_store.ensureStore(dbPath=dbPath)
+    session = pooledSession(workers)
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='events-page') as pool:
+            pending = {pool.submit(fetchPage, session, url, cacheDir): url for url in urls}
+            while pending:
+                for future in as_completed(list(pending)):
+                    url = pending.pop(future)
+                    try:
+                        html, fromCache = future.result()
+                    except requests.RequestException as error:
+                        logger.warning("Could not fetch %s: %s", url, error)
+                        totals['failedPages'] += 1
+                        continue
+                    #One page with markup this parser doesn't expect shouldn't stop the pages after it
+                    try:
+                        events, nextUrl = parseEventsPage(html, url)
+                    except Exception:
+                        logger.warning("Could not read the events on %s", url, exc_info=True)
+                        totals['failedPages'] += 1
+                        continue
+                    priced = pricedEvents(events)
+                    added, version = pairing_store.addPairings(priced, dbPath)
+                    totals['pages'] += 1
+                    totals['notModified'] += fromCache
+                    totals['events'] += len(events)
+                    totals['added'] += added
+                    totals['unpriced'] += len(events) - len(priced)
+                    totals['version'] = version
+                    if onPage is not None:
+                        onPage(dict(totals))
+                    if nextUrl is not None and nextUrl not in seen and len(seen) < MAX_PAGES:
+                        seen.add(nextUrl)
+                        pending[pool.submit(fetchPage, session, nextUrl, cacheDir)] = nextUrl
+    finally:
+        session.close()
+    return totals
+
+
+#Start fetching in the background unless a fetch is already running. The dashboard only ever reads fetchStatus(), so a rerun never waits on the network
+def startFetch(urls=None):
+    urls = urls or EVENTS_URLS
+    with _lock:
+        if _status['state'] == 'running' or not urls:
+            return False
+        _status.update(state='running', pages=0, notModified=0, failedPages=0, events=0, added=0, unpriced=0, version=None, error=None)
+    _executor.submit(_runFetch, urls)
+    return True
+
+
+def _runFetch(urls):
+    try:
+        totals = fetchEvents(urls, onPage=lambda totals: _updateStatus(**totals))
+        _updateStatus(state='done', **totals)
+    except Exception as error:
+        logger.exception("Could not fetch the events listing")
+        _updateStatus(state='failed', error=str(error))
+
+
+def _updateStatus(**values):
+    with _lock:
+        _status.update(values)
+
+
+def fetchStatus():
+    with _lock:
+        return dict(_status)
@@ -0,0 +1,57 @@
+import os
+import threading
+from collections import OrderedDict
+
+import plotly.io as pio
+
+import dataset_registry
+from instrumentation import stage
+
+
+#Finished figure specs shared by every session, keyed by (dataset key, chart type, chart parameters).
+#The dataset key includes the pairing table version, so saving a pairing makes every older figure unreachable
+MAX_FIGURE_BYTES = int(os.environ.get('WCC_FIGURE_CACHE_BYTES', 64 * 1024 * 1024))
+
+_lock = threading.Lock()
+_figures = OrderedDict()
+_sizes = {'bytes': 0}
+figureCounts = {'hits': 0, 'misses': 0}
+
+
+#Return the cached spec for this chart, or call build() to make the plotly figure and cache its spec.
+#The least recently used specs are dropped once the cache grows past MAX_FIGURE_BYTES
+def cachedFigure(dataKey, chartType, params, build):
+    key = (dataKey, chartType, params)
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            figureCounts['hits'] += 1
+            return _figures[key][0]
+        figureCounts['misses'] += 1
+
+    with stage('figureBuild'):
+        spec = build().to_dict()
+    size = len(pio.to_json(spec, validate=False))
+    with _lock:
+        if key not in _figures:
+            _figures[key] = (spec, size)
+            _sizes['bytes'] += size
+        while _sizes['bytes'] > MAX_FIGURE_BYTES and len(_figures) > 1:
+            _, (_, evictedSize) = _figures.popitem(last=False)
+            _sizes['bytes'] -= evictedSize
+    return spec
+
+
+#Forget every figure built from a dataset, called when the registry releases it
+def dropDataset(dataKey):
+    with _lock:
+        for key in [key for key in _figures if key[0] == dataKey]:
+            _sizes['bytes'] -= _figures.pop(key)[1]
+
+
+def figureCacheStats():
+    with _lock:
+        return {'hits': figureCounts['hits'], 'misses': figureCounts['misses'], 'figures': len(_figures), 'bytes': _sizes['bytes']}
+
+
+dataset_registry.releaseListeners.append(dropDataset)
@@ -0,0 +1,138 @@
+import hashlib
+import io
+import logging
+import os
+
+import pandas as pd
+import python_calamine
+
+import schema
+from parse_cache import cachedFrame, readSourceBytes
+from schema import FIELD_DTYPES, compactFrame, fieldName, frameBytes, renameFields, rowFingerprints
+
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_SHEET = 'Form Responses 1'
+PAIRING_SHEET = 'Sheet1'
+
+#Large response files are parsed this many rows at a time, so only one chunk of raw cells is held as python objects at once
+CHUNK_ROWS = int(os.environ.get('WCC_INGEST_CHUNK_ROWS', 50_000))
+
+#Dtypes the yes/no answers are read with, so nothing has to be inferred from them. The other fields are parsed and compacted by normalizeResponses
+RAW_DTYPES = {'sponsor': 'string', 'member': 'string'}
+
+#Leading bytes of xlsx (zip) and xls (OLE) workbooks. Anything else is read as a CSV export of the form
+WORKBOOK_SIGNATURES = (b'PK\x03\x04', b'\xd0\xcf\x11\xe0')
+
+#Any change to the parsing or schema code changes the version, which invalidates everything parsed by older code
+_codeHash = hashlib.sha256()
+for _module in (__file__, schema.__file__):
+    with open(_module, 'rb') as _source:
+        _codeHash.update(_source.read())
+CODE_VERSION = _codeHash.hexdigest()
+
+
+def yesNoFlag(column):
+    return column.str.lower().map({'yes': True, 'no': False}).astype('boolean')
+
+
+#Rename the form questions to short fields, turn the yes/no answers into flags and the submission time into the day of the event.
+#Each response also gets a fingerprint, so a later export of the same form can be checked for rows that were already ingested
+def normalizeResponses(temp_df):
+    temp_df = renameFields(temp_df)
+    temp_df['sponsor'] = yesNoFlag(temp_df['sponsor'])
+    temp_df['member'] = yesNoFlag(temp_df['member'])
+    submittedAt = pd.to_datetime(temp_df['date'])
+    temp_df['attendees'] = pd.to_numeric(temp_df['attendees'], errors='coerce')
+    temp_df = compactFrame(temp_df.assign(date=submittedAt))
+    temp_df['fingerprint'] = rowFingerprints(temp_df)
+    temp_df['date'] = submittedAt.dt.normalize()
+    return temp_df
+
+
+#Only the columns the app uses are read, everything else in the form is skipped
+def usedColumn(header):
+    return fieldName(header) in FIELD_DTYPES
+
+
+def rawDtypes(headers):
+    return {header: RAW_DTYPES[fieldName(header)] for header in headers if fieldName(header) in RAW_DTYPES}
+
+
+#Yield the used columns of the response sheet in frames of up to CHUNK_ROWS rows, along with the number of rows in the sheet
+def readWorkbookChunks(fileBytes):
+    sheet = python_calamine.CalamineWorkbook.from_filelike(io.BytesIO(fileBytes)).get_sheet_by_name(RESPONSE_SHEET)
+    rows = sheet.iter_rows()
+    header = next(rows, [])
+    keep = [index for index, column in enumerate(header) if usedColumn(column)]
+    columns = [header[index] for index in keep]
+    totalRows = max(sheet.height - 1, 0)
+
+    def toFrame(chunk):
+        #calamine reports empty cells as empty strings, which read_excel turns into missing values
+        frame = pd.DataFrame(chunk, columns=columns).replace('', None)
+        return frame.astype(rawDtypes(columns))
+
+    chunk = []
+    for row in rows:
+        chunk.append([row[index] for index in keep])
+        if len(chunk) == CHUNK_ROWS:
+            yield toFrame(chunk), totalRows
+            chunk = []
+    if chunk or not keep:
+        yield toFrame(chunk), totalRows
+
+
+def readCsvChunks(fileBytes):
+    headers = pd.read_csv(io.BytesIO(fileBytes), nrows=0).columns
+    totalRows = max(fileBytes.count(b'\n') - 1, 0)
+    for chunk in pd.read_csv(io.BytesIO(fileBytes), usecols=usedColumn, dtype=rawDtypes(headers), chunksize=CHUNK_ROWS):
+        yield chunk, totalRows
+
+
+def readResponseChunks(fileBytes):
+    if fileBytes.startswith(WORKBOOK_SIGNATURES):
+        return readWorkbookChunks(fileBytes)
+    return readCsvChunks(fileBytes)
+
+
+#The used columns of the response sheet as one raw frame
+def readResponseSheet(fileBytes):
+    return pd.concat([chunk for chunk, _ in readResponseChunks(fileBytes)], ignore_index=True)
+
+
+#Parse a response workbook or CSV export chunk by chunk, normalizing each chunk before reading the next.
+#progress(rowsRead, totalRows) is called after every chunk when given
+def parseResponses(fileBytes, progress=None):
+    rawBytes = 0
+    chunks = []
+    rowsRead = 0
+    for raw, totalRows in readResponseChunks(fileBytes):
+        rawBytes += frameBytes(raw)
+        chunks.append(normalizeResponses(raw))
+        rowsRead += len(raw)
+        if progress is not None:
+            progress(rowsRead, max(totalRows, rowsRead))
+
+    #Each chunk has its own organization categories, so the joined frame is compacted once more to share them
+    temp_df = compactFrame(pd.concat(chunks, ignore_index=True))
+    temp_df.attrs['memory'] = {'before': rawBytes, 'after': frameBytes(temp_df)}
+    logger.info("Compacted %d responses from %.1f MB to %.1f MB", len(temp_df), rawBytes / 1e6, temp_df.attrs['memory']['after'] / 1e6)
+    return temp_df
+
+
+def parsePairingTable(fileBytes):
+    dateNamePairing = pd.read_excel(io.BytesIO(fileBytes), engine='calamine', sheet_name=[PAIRING_SHEET])[PAIRING_SHEET]
+    dateNamePairing['Date'] = pd.to_datetime(dateNamePairing['Date']).dt.date
+    return dateNamePairing
+
+
+#Load the normalized form responses from an upload, reusing the cached columns when the same workbook was seen before
+def loadResponses(uploaded_file, progress=None):
+    return cachedFrame('responses', readSourceBytes(uploaded_file), CODE_VERSION, lambda fileBytes: parseResponses(fileBytes, progress))
+
+
+#Load the date to event pairing sheet, reusing the cached columns while the file is unchanged
+def loadPairingTable(path="DateNamePairings.xlsx"):
+    return cachedFrame('pairings', readSourceBytes(path), CODE_VERSION, parsePairingTable)
@@ -0,0 +1,146 @@
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import dataset_registry
+import pairing_store
+from dataset_registry import datasetKey
+from ingest import loadResponses
+from parse_cache import contentHash
+from pipeline import appendResponsesToDataset, buildDataset
+
+
+logger = logging.getLogger(__name__)
+
+#Uploads are parsed on this many worker threads, so sessions keep rendering while their file is read.
+#Threads rather than processes, because the finished dataset goes into the shared in-process registry
+WORKERS = int(os.environ.get('WCC_INGEST_WORKERS', 4))
+
+#Stages an upload goes through, in order, with the text shown next to its progress bar
+STAGES = {
+    'queued': "Waiting for a free worker",
+    'pairings': "Loading the pairing table",
+    'waiting': "Waiting for another upload of this file",
+    'parsing': "Reading the responses",
+    'building': "Pairing responses with events and summarizing them",
+    'done': "Finished",
+    'failed': "Failed",
+    'cancelled': "Cancelled",
+}
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='ingest')
+_lock = threading.Lock()
+_jobs = {}
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+#Queue an upload to be turned into a shared dataset for sessionId. Returns the job id to poll with job().
+#With appendTo set to the key of a dataset, the upload is treated as a newer export of the same form and only its new responses are added to that dataset
+def submit(fileBytes, fileName, sessionId, appendTo=None):
+    jobId = uuid.uuid4().hex
+    job = {
+        'id': jobId,
+        'fileName': fileName,
+        'sessionId': sessionId,
+        'stage': 'queued',
+        'progress': 0.0,
+        'message': STAGES['queued'],
+        'key': None,
+        'appendTo': appendTo,
+        'error': None,
+        'cancel': threading.Event(),
+    }
+    with _lock:
+        _jobs[jobId] = job
+    job['future'] = _executor.submit(_run, job, fileBytes)
+    return jobId
+
+
+def job(jobId):
+    with _lock:
+        return _jobs.get(jobId)
+
+
+def finished(job):
+    return job['stage'] in ('done', 'failed', 'cancelled')
+
+
+#Ask a job to stop. A queued job never starts, a running one stops at the next chunk or stage
+def cancel(jobId):
+    current = job(jobId)
+    if current is None or finished(current):
+        return
+    current['cancel'].set()
+    if current['future'].cancel():
+        _setStage(current, 'cancelled')
+
+
+#Forget a job once its session has picked up the result
+def forget(jobId):
+    with _lock:
+        _jobs.pop(jobId, None)
+
+
+def _setStage(job, stage, progress=None, message=None):
+    job['stage'] = stage
+    if progress is not None:
+        job['progress'] = progress
+    job['message'] = message or STAGES[stage]
+
+
+def _checkCancelled(job):
+    if job['cancel'].is_set():
+        raise IngestCancelled()
+
+
+def _run(job, fileBytes):
+    try:
+        fileHash = contentHash(fileBytes)
+        _checkCancelled(job)
+        _setStage(job, 'pairings', 0.05)
+        pairing_store.ensureStore()
+        dateNamePairing, pairingVersion = pairing_store.loadPairingTable()
+        key = datasetKey(fileHash, pairingVersion)
+
+        def showProgress(rowsRead, totalRows):
+            _checkCancelled(job)
+            _setStage(job, 'parsing', 0.1 + 0.8 * rowsRead / max(totalRows, 1), f"Read {rowsRead:,} of {totalRows:,} responses")
+
+        def build():
+            _setStage(job, 'parsing', 0.1)
+            originalDF = loadResponses(fileBytes, showProgress)
+            _checkCancelled(job)
+            _setStage(job, 'building', 0.9)
+            base = dataset_registry.get(job['appendTo'], job['sessionId']) if job['appendTo'] else None
+            #A dataset paired against an older version of the pairing table can't be extended, so it is rebuilt in full
+            if base is not None and base['pairingVersion'] == pairingVersion:
+                return appendResponsesToDataset(base, originalDF, fileHash)
+            return buildDataset(originalDF, dateNamePairing, pairingVersion, fileHash)
+
+        #While another session builds the same dataset this job waits for it, and can still be cancelled
+        def waitForBuild():
+            _checkCancelled(job)
+            _setStage(job, 'waiting', 0.1)
+
+        #Another session building the same dataset may be cancelled, in which case this job builds it instead
+        while True:
+            _checkCancelled(job)
+            try:
+                dataset_registry.acquire(key, job['sessionId'], build, waitForBuild)
+                break
+            except IngestCancelled:
+                if job['cancel'].is_set():
+                    raise
+        job['key'] = key
+        _setStage(job, 'done', 1.0)
+    except IngestCancelled:
+        _setStage(job, 'cancelled')
+    except Exception as error:
+        logger.exception("Could not process %s", job['fileName'])
+        job['error'] = error
+        _setStage(job, 'failed', message=f"Failed: {error}")
@@ -0,0 +1,172 @@
+import collections
+import contextlib
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+#Every recorded run is written as one bare JSON line, to the file named by WCC_INSTRUMENT_LOG or to stderr
+_handler = logging.FileHandler(os.environ['WCC_INSTRUMENT_LOG']) if os.environ.get('WCC_INSTRUMENT_LOG') else logging.StreamHandler()
+_handler.setFormatter(logging.Formatter('%(message)s'))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+#Instrumentation is off unless WCC_INSTRUMENT=1 is set or a session opens the app with ?debug=1.
+#While no run is being recorded on a thread, stage() hands back one shared no-op context, so the instrumented code pays a single lookup
+ENABLED = os.environ.get('WCC_INSTRUMENT') == '1'
+
+#Stage timings from this many recent runs are kept per stage for the rolling percentiles
+HISTORY_RUNS = int(os.environ.get('WCC_INSTRUMENT_HISTORY', 200))
+
+_NOT_RECORDING = contextlib.nullcontext()
+_local = threading.local()
+_lock = threading.Lock()
+_history = collections.defaultdict(lambda: collections.deque(maxlen=HISTORY_RUNS))
+#Runs being recorded, by thread. Memory tracing slows every allocation in the process, so it only stays on while one of them is open
+_activeRuns = {}
+
+#Set by the app to a function telling whether the session being run asked for instrumentation, so its fragment reruns are recorded too
+sessionEnabled = lambda: False
+
+
+def currentRun():
+    return getattr(_local, 'run', None)
+
+
+#Start recording a run (a script rerun or a fragment rerun) on this thread. A run left open by an interrupted rerun is finished first
+def startRun(name, enabled=ENABLED):
+    if currentRun() is not None:
+        finishRun()
+    if not enabled:
+        return None
+    run = {'name': name, 'start': time.perf_counter(), 'stages': [], 'stack': [], 'payloads': {}}
+    with _lock:
+        #A rerun stopped by st.rerun() never finishes its run, so runs left by threads that have ended are dropped here
+        liveThreads = {thread.ident for thread in threading.enumerate()}
+        for ident in [ident for ident in _activeRuns if ident not in liveThreads]:
+            del _activeRuns[ident]
+        _activeRuns[threading.get_ident()] = run
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+    _local.run = run
+    return run
+
+
+#Stop recording, add the stage timings to the rolling history and write the run as one JSON log line
+def finishRun():
+    run = currentRun()
+    if run is None:
+        return None
+    _local.run = None
+    run['seconds'] = time.perf_counter() - run['start']
+    with _lock:
+        for stageRecord in run['stages']:
+            _history[stageRecord['name']].append(stageRecord['seconds'])
+        _activeRuns.pop(threading.get_ident(), None)
+        if not _activeRuns:
+            tracemalloc.stop()
+    logger.info(json.dumps({
+        'run': run['name'],
+        'seconds': round(run['seconds'], 6),
+        'stages': [{key: stageRecord[key] for key in ('name', 'seconds', 'peakBytes')} for stageRecord in run['stages']],
+        'percentiles': stagePercentiles([stageRecord['name'] for stageRecord in run['stages']]),
+        'payloads': run['payloads'],
+    }))
+    return run
+
+
+@contextlib.contextmanager
+def _recordStage(run, name):
+    parent = run['stack'][-1] if run['stack'] else None
+    record = {'name': name if parent is None else parent['name'] + '/' + name, 'seconds': 0.0, 'peakBytes': 0}
+    run['stack'].append(record)
+    startMemory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    record['childPeak'] = 0
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record['seconds'] = round(time.perf_counter() - start, 6)
+        #reset_peak() is shared by nested stages, so a stage's peak is the larger of its own and its children's
+        peak = max(tracemalloc.get_traced_memory()[1], record.pop('childPeak'))
+        record['peakBytes'] = max(0, peak - startMemory)
+        run['stack'].pop()
+        if parent is not None:
+            parent['childPeak'] = max(parent['childPeak'], peak)
+        run['stages'].append(record)
+
+
+#Time a named stage of the current run, including the peak memory allocated while it ran. Does nothing when no run is being recorded
+def stage(name):
+    run = getattr(_local, 'run', None)
+    if run is None:
+        return _NOT_RECORDING
+    return _recordStage(run, name)
+
+
+#Record how many bytes an element (a chart spec or the options of a selectbox) sent to the browser in the current run.
+#size is a function, so the element is only serialized to measure it while a run is being recorded
+def payload(name, size):
+    run = getattr(_local, 'run', None)
+    if run is not None:
+        run['payloads'][name] = size()
+
+
+#Decorator recording every call of a function as a stage, or as a run of its own when it is called outside of one (a fragment rerun)
+def instrumented(name):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if currentRun() is not None:
+                with stage(name):
+                    return function(*args, **kwargs)
+            if not ENABLED and not sessionEnabled():
+                return function(*args, **kwargs)
+            startRun(name, enabled=True)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                finishRun()
+        return wrapper
+    return decorator
+
+
+#p50 and p95 of the recent timings of each named stage, in seconds
+def stagePercentiles(names=None):
+    with _lock:
+        names = list(_history) if names is None else names
+        samples = {name: list(_history[name]) for name in names if _history.get(name)}
+    return {
+        name: {'p50': round(float(np.percentile(timings, 50)), 6), 'p95': round(float(np.percentile(timings, 95)), 6), 'runs': len(timings)}
+        for name, timings in samples.items()
+    }
+
+
+#One row per stage of a run with its time, peak memory and the rolling percentiles of the same stage, for the debug panel
+def breakdown(run):
+    percentiles = stagePercentiles([stageRecord['name'] for stageRecord in run['stages']])
+    return [
+        {
+            'stage': stageRecord['name'],
+            'ms': round(stageRecord['seconds'] * 1000, 1),
+            'peak MB': round(stageRecord['peakBytes'] / 1e6, 2),
+            'p50 ms': round(percentiles.get(stageRecord['name'], {}).get('p50', 0) * 1000, 1),
+            'p95 ms': round(percentiles.get(stageRecord['name'], {}).get('p95', 0) * 1000, 1),
+        }
+        for stageRecord in run['stages']
+    ]
+
+
+#One row per element recorded with payload() in a run, largest first, for the debug panel
+def payloadBreakdown(run):
+    return [{'element': name, 'KB': round(size / 1e3, 2)} for name, size in sorted(run['payloads'].items(), key=lambda item: -item[1])]
@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from schema import FIELD_DTYPES
+
+
+#Columns added to the responses by the pairing, in the order the dashboard expects them
+PAIRING_COLUMNS = ['eventName', 'nonMemberPrice', 'memberPrice']
+
+
+#Turn the pairing sheet (Date, Event Name, Price for Non-Members, Price for Members) into a lookup table indexed by date
+def buildPairingLookup(dateNamePairing):
+    lookup = dateNamePairing.iloc[:, [0, 1, 2, 3]].copy()
+    lookup.columns = ['date'] + PAIRING_COLUMNS
+    lookup['date'] = pd.to_datetime(lookup['date'])
+
+    #A date can show up more than once in the sheet, since new pairings are appended to the end of it.
+    #The newest row wins, which is what the old dictionary based lookup did as well
+    lookup = lookup.drop_duplicates(subset='date', keep='last')
+    return lookup.set_index('date')
+
+
+#Responses dated up to this many days from an event are counted towards it when their own date has no pairing,
+#since the form is often filled in a day or two after the event
+MATCH_WINDOW_DAYS = int(os.environ.get('WCC_MATCH_WINDOW_DAYS', 2))
+
+
+#For each date, the row of lookup it is paired with: the pairing on that exact date when there is one (including "no event" rows),
+#otherwise the nearest event within window days, the earlier one on a tie. Dates with neither get NaN
+def matchDates(lookup, dates, window=MATCH_WINDOW_DAYS):
+    dates = pd.DatetimeIndex(dates)
+    matched = lookup.reindex(dates)
+    unmatched = ~dates.isin(lookup.index)
+    events = lookup[lookup['eventName'].notna()].sort_index()
+    if window <= 0 or not unmatched.any() or events.empty:
+        return matched
+
+    #Binary search the sorted event dates for the events either side of every unmatched date
+    eventDates = events.index.to_numpy()
+    targets = dates[unmatched].to_numpy()
+    after = np.searchsorted(eventDates, targets, side='left')
+    before = np.clip(after - 1, 0, len(eventDates) - 1)
+    after = np.clip(after, 0, len(eventDates) - 1)
+    beforeGap = np.abs(targets - eventDates[before])
+    afterGap = np.abs(eventDates[after] - targets)
+    nearest = np.where(afterGap < beforeGap, after, before)
+    gap = np.minimum(beforeGap, afterGap)
+    inWindow = gap <= np.timedelta64(window, 'D')
+
+    nearestRows = events.iloc[nearest].to_numpy()
+    nearestRows[~inWindow] = np.nan
+    matched.loc[unmatched, PAIRING_COLUMNS] = nearestRows
+    return matched
+
+
+#Pair every response with the event held on or near its date using keyed and binary search lookups rather than a row by row loop
+#Returns the paired responses (rows without an event are dropped) and the set of response dates that have no pairing yet
+def pairResponses(originalDF, dateNamePairing, window=MATCH_WINDOW_DAYS):
+    lookup = buildPairingLookup(dateNamePairing)
+    #Match each distinct date once, then spread the matches over the rows
+    uniqueDates = pd.DatetimeIndex(originalDF['date'].dropna().unique())
+    matchedDates = matchDates(lookup, uniqueDates, window)
+    matchedRows = matchedDates.reindex(originalDF['date'].to_numpy())
+
+    paired = originalDF.copy()
+    for column in PAIRING_COLUMNS:
+        paired[column] = matchedRows[column].to_numpy()
+
+    isKnown = uniqueDates.isin(lookup.index) | matchedDates['eventName'].notna().to_numpy()
+    unknownDates = {date.date() for date in uniqueDates[~isKnown]}
+
+    paired.dropna(subset=['eventName'], inplace=True)
+    paired = paired.astype({column: FIELD_DTYPES[column] for column in PAIRING_COLUMNS})
+    return paired, unknownDates
+
+
+#Group the response row positions by date once per upload, so saving a pairing only has to look at the rows from that date
+def buildDateIndex(originalDF):
+    return originalDF.groupby('date', sort=False).indices
+
+
+#Add the positions of rows appended at offset to a date index, leaving the index passed in untouched
+def extendDateIndex(dateIndex, newRows, offset):
+    extended = dict(dateIndex)
+    for date, positions in buildDateIndex(newRows).items():
+        positions = positions + offset
+        extended[date] = np.concatenate([extended[date], positions]) if date in extended else positions
+    return extended
+
+
+#Pair the responses from the given dates with a newly saved event, using the date index built at upload
+def pairDates(originalDF, dateIndex, dates, eventName, nonMemberPrice, memberPrice):
+    positions = [dateIndex[pd.Timestamp(date)] for date in dates if pd.Timestamp(date) in dateIndex]
+    newRows = originalDF.iloc[np.sort(np.concatenate(positions)) if positions else []].copy()
+    newRows['eventName'] = eventName
+    newRows['nonMemberPrice'] = nonMemberPrice
+    newRows['memberPrice'] = memberPrice
+    return newRows.astype({column: FIELD_DTYPES[column] for column in PAIRING_COLUMNS})
@@ -0,0 +1,143 @@
+import os
+import sqlite3
+from contextlib import contextmanager
+
+import pandas as pd
+
+from ingest import loadPairingTable as loadPairingWorkbook
+
+
+#Pairings live in an append only SQLite table. Saving a date adds a row, and the newest row for a date is the one that counts
+DB_PATH = os.environ.get('WCC_PAIRING_DB', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pairings.sqlite3'))
+XLSX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DateNamePairings.xlsx')
+
+#Column names used by DateNamePairings.xlsx, in the order findPairings expects them
+XLSX_COLUMNS = ['Date', 'Event Name', 'Price for Non-Members', 'Price for Members']
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pairings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    eventName TEXT,
+    nonMemberPrice REAL,
+    memberPrice REAL,
+    createdAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+'''
+
+
+def connect(path=None):
+    connection = sqlite3.connect(path or DB_PATH, timeout=30, isolation_level=None)
+    #WAL lets sessions keep reading while another one is saving a pairing
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute(SCHEMA)
+    return connection
+
+
+def _toValue(value):
+    return None if pd.isna(value) else value
+
+
+def _insertRows(connection, rows):
+    connection.executemany(
+        'INSERT INTO pairings (date, eventName, nonMemberPrice, memberPrice) VALUES (?, ?, ?, ?)',
+        [(str(date), _toValue(eventName), _toValue(nonMemberPrice), _toValue(memberPrice)) for date, eventName, nonMemberPrice, memberPrice in rows],
+    )
+
+
+#Run the statements inside the block as one write transaction, taking the write lock up front
+@contextmanager
+def transaction(connection):
+    connection.execute('BEGIN IMMEDIATE')
+    try:
+        yield connection
+    except BaseException:
+        connection.execute('ROLLBACK')
+        raise
+    connection.execute('COMMIT')
+
+
+def _importWorkbook(connection, source):
+    dateNamePairing = loadPairingWorkbook(source)
+    _insertRows(connection, dateNamePairing[XLSX_COLUMNS].itertuples(index=False))
+    return len(dateNamePairing)
+
+
+def _version(connection):
+    return connection.execute('SELECT COALESCE(MAX(id), 0) FROM pairings').fetchone()[0]
+
+
+#Copy the rows of a DateNamePairings.xlsx style workbook (a path or an upload) into the store, keeping their order.
+#The rows are appended, so a date in the workbook replaces the pairing the store had for it. Returns the rows imported and the new store version
+def importXlsx(source=XLSX_PATH, dbPath=None):
+    connection = connect(dbPath)
+    try:
+        with transaction(connection):
+            imported = _importWorkbook(connection, source)
+            version = _version(connection)
+    finally:
+        connection.close()
+    return imported, version
+
+
+#Seed an empty store from DateNamePairings.xlsx. The check and the import share one transaction so two sessions can't both import
+def ensureStore(xlsxPath=XLSX_PATH, dbPath=None):
+    connection = connect(dbPath)
+    try:
+        with transaction(connection):
+            if connection.execute('SELECT COUNT(*) FROM pairings').fetchone()[0] == 0 and os.path.exists(xlsxPath):
+                _importWorkbook(connection, xlsxPath)
+    finally:
+        connection.close()
+
+
+#Append one pairing and return the new version of the store. A missing title records that there was no event on that date
+def addPairing(date, eventName, nonMemberPrice, memberPrice, dbPath=None):
+    connection = connect(dbPath)
+    try:
+        cursor = connection.execute(
+            'INSERT INTO pairings (date, eventName, nonMemberPrice, memberPrice) VALUES (?, ?, ?, ?)',
+            (str(date), _toValue(eventName), _toValue(nonMemberPrice), _toValue(memberPrice)),
+        )
+        return cursor.lastrowid
+    finally:
+        connection.close()
+
+
+#Append many pairings in one transaction, skipping dates the store already has a pairing for so a repeated import adds nothing.
+#Returns how many rows were added and the new version of the store
+def addPairings(dateNamePairing, dbPath=None):
+    connection = connect(dbPath)
+    try:
+        with transaction(connection):
+            knownDates = {row[0] for row in connection.execute('SELECT DISTINCT date FROM pairings')}
+            rows = [row for row in dateNamePairing[XLSX_COLUMNS].itertuples(index=False) if str(row[0]) not in knownDates]
+            _insertRows(connection, rows)
+            version = _version(connection)
+    finally:
+        connection.close()
+    return len(rows), version
+
+
+#Return every pairing in insertion order, in the same layout as DateNamePairings.xlsx, along with the current store version
+def loadPairingTable(dbPath=None):
+    connection = connect(dbPath)
+    try:
+        rows = connection.execute('SELECT id, date, eventName, nonMemberPrice, memberPrice FROM pairings ORDER BY id').fetchall()
+    finally:
+        connection.close()
+
+    dateNamePairing = pd.DataFrame([row[1:] for row in rows], columns=XLSX_COLUMNS)
+    dateNamePairing['Date'] = pd.to_datetime(dateNamePairing['Date']).dt.date
+    dateNamePairing['Price for Non-Members'] = pd.to_numeric(dateNamePairing['Price for Non-Members'])
+    dateNamePairing['Price for Members'] = pd.to_numeric(dateNamePairing['Price for Members'])
+    version = rows[-1][0] if rows else 0
+    return dateNamePairing, version
+
+
+#Write the current pairings (one row per date) to an xlsx file or buffer, for anyone still working from the spreadsheet
+def exportXlsx(target=XLSX_PATH, dbPath=None):
+    dateNamePairing, _ = loadPairingTable(dbPath)
+    dateNamePairing = dateNamePairing.drop_duplicates(subset='Date', keep='last')
+    dateNamePairing.to_excel(target, index=False, sheet_name='Sheet1')
+    return len(dateNamePairing)
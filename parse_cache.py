@@ -0,0 +1,92 @@
+import hashlib
+import logging
+import os
+import threading
+
+import pandas as pd
+
+
+logger = logging.getLogger(__name__)
+
+#Parsed workbooks are kept as parquet files in this folder, and the oldest ones are removed once it grows past the size cap
+CACHE_DIR = os.environ.get('WCC_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'parsed'))
+MAX_CACHE_BYTES = int(os.environ.get('WCC_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+#Hit and miss counts for this server process, shown in the sidebar
+cacheCounts = {'hits': 0, 'misses': 0}
+
+
+#Read the raw bytes of a Streamlit UploadedFile or a path on disk, passing bytes that were already read straight through
+def readSourceBytes(source):
+    if isinstance(source, bytes):
+        return source
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    with open(source, 'rb') as file:
+        return file.read()
+
+
+def contentHash(fileBytes):
+    return hashlib.sha256(fileBytes).hexdigest()
+
+
+#The cache key combines the file contents with the version of the code that parsed it, so changing the parsing code invalidates old entries
+def cacheKey(kind, fileBytes, codeVersion):
+    return kind + '-' + codeVersion[:16] + '-' + contentHash(fileBytes)
+
+
+#Return the parsed frame for these bytes, either from the cache or by calling parse(fileBytes) and storing the result
+def cachedFrame(kind, fileBytes, codeVersion, parse):
+    path = os.path.join(CACHE_DIR, cacheKey(kind, fileBytes, codeVersion) + '.parquet')
+
+    if os.path.exists(path):
+        try:
+            frame = pd.read_parquet(path)
+        except Exception:
+            logger.warning("Discarding unreadable cache entry %s", path, exc_info=True)
+        else:
+            #Touch the file so the least recently used entries are the ones that get evicted
+            os.utime(path)
+            cacheCounts['hits'] += 1
+            logger.info("Parse cache hit for %s (%d hits, %d misses)", kind, cacheCounts['hits'], cacheCounts['misses'])
+            return frame
+
+    cacheCounts['misses'] += 1
+    logger.info("Parse cache miss for %s (%d hits, %d misses)", kind, cacheCounts['hits'], cacheCounts['misses'])
+    frame = parse(fileBytes)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        #Write to a temporary file first so another session never reads a half written entry.
+        #Uploads are parsed on several threads, so the name is unique per thread as well as per process
+        temporaryPath = path + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        frame.to_parquet(temporaryPath, index=False)
+        os.replace(temporaryPath, path)
+        evictOldEntries()
+    except Exception:
+        logger.warning("Could not store %s in the parse cache", kind, exc_info=True)
+    return frame
+
+
+#Remove the least recently used entries until the cache folder fits under MAX_CACHE_BYTES
+def evictOldEntries():
+    entries = []
+    for name in os.listdir(CACHE_DIR):
+        if name.endswith('.parquet'):
+            stat = os.stat(os.path.join(CACHE_DIR, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+    totalBytes = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if totalBytes <= MAX_CACHE_BYTES:
+            break
+        try:
+            os.remove(os.path.join(CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        totalBytes -= size
+
+
+def cacheStats():
+    entries = [name for name in os.listdir(CACHE_DIR) if name.endswith('.parquet')] if os.path.isdir(CACHE_DIR) else []
+    totalBytes = sum(os.path.getsize(os.path.join(CACHE_DIR, name)) for name in entries)
+    return {'hits': cacheCounts['hits'], 'misses': cacheCounts['misses'], 'entries': len(entries), 'bytes': totalBytes}
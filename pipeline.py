@@ -0,0 +1,134 @@
+import datetime
+
+import pandas as pd
+
+from aggregates import addDerivedColumns, buildCube, buildEventIndex, buildEventSummary, buildTimeline, mergeCubes
+from ingest import loadResponses
+from instrumentation import stage
+from pairing import MATCH_WINDOW_DAYS, buildDateIndex, extendDateIndex, pairDates, pairResponses
+from parse_cache import contentHash, readSourceBytes
+from schema import appendRows
+
+
+#Everything the dashboard shows for one upload at one version of the pairing table. Datasets are shared between sessions and never modified
+def buildDataset(originalDF, dateNamePairing, pairingVersion, contentHash=None):
+    with stage('pairing'):
+        paired, unknownDates = pairResponses(originalDF, dateNamePairing)
+        rowsByDate = buildDateIndex(originalDF)
+    with stage('revenue'):
+        df = addDerivedColumns(paired)
+    with stage('groupbys'):
+        cube = buildCube(df)
+        eventSummary = buildEventSummary(cube)
+        eventIndex = buildEventIndex(eventSummary)
+        timeline = buildTimeline(cube)
+    return {
+        'contentHash': contentHash,
+        'pairingVersion': pairingVersion,
+        'originalDF': originalDF,
+        'rowsByDate': rowsByDate,
+        'dateNamePairing': dateNamePairing,
+        'unknownDates': frozenset(unknownDates),
+        'df': df,
+        'cube': cube,
+        'eventSummary': eventSummary,
+        'eventIndex': eventIndex,
+        'timeline': timeline,
+    }
+
+
+#Read a response workbook or CSV export (an upload or a path) and build its dataset. This is the one entry point the dashboard and the batch reports share.
+#progress(rowsRead, totalRows) is called while a file that isn't cached yet is parsed
+def loadDataset(source, dateNamePairing, pairingVersion, fileHash=None, progress=None):
+    if fileHash is None:
+        fileHash = contentHash(readSourceBytes(source))
+    with stage('parse'):
+        originalDF = loadResponses(source, progress)
+    return buildDataset(originalDF, dateNamePairing, pairingVersion, fileHash)
+
+
+#Build the next version of a dataset after one pairing was saved, touching only the responses from that date
+#and, for an event, the unpaired days within the matching window around it
+def applyPairingToDataset(dataset, date, eventName, nonMemberPrice, memberPrice, pairingVersion):
+    #The new row takes the table's dtypes, so a "no event" row of missing values doesn't change them
+    table = dataset['dateNamePairing']
+    newPairing = pd.DataFrame([[date, eventName, nonMemberPrice, memberPrice]], columns=table.columns).astype(table.dtypes.to_dict())
+    dateNamePairing = pd.concat([table, newPairing], ignore_index=True)
+
+    affectedDates = {date}
+    if not pd.isna(eventName):
+        window = datetime.timedelta(days=MATCH_WINDOW_DAYS)
+        affectedDates |= {day.date() for day in dataset['rowsByDate'] if abs(day.date() - date) <= window}
+
+    if not affectedDates <= dataset['unknownDates']:
+        #Re-pairing a date that already had an event (or moving days over from a farther event) would mean taking rows back out, so start over from the full table
+        return buildDataset(dataset['originalDF'], dateNamePairing, pairingVersion, dataset['contentHash'])
+
+    df = dataset['df']
+    cube = dataset['cube']
+    if not pd.isna(eventName):
+        newRows = addDerivedColumns(pairDates(dataset['originalDF'], dataset['rowsByDate'], affectedDates, eventName, nonMemberPrice, memberPrice))
+        df = appendRows(df, newRows)
+        cube = mergeCubes(cube, buildCube(df.iloc[len(dataset['df']):]))
+
+    eventSummary = buildEventSummary(cube)
+    return dict(
+        dataset,
+        pairingVersion=pairingVersion,
+        dateNamePairing=dateNamePairing,
+        unknownDates=dataset['unknownDates'] - affectedDates,
+        df=df,
+        cube=cube,
+        eventSummary=eventSummary,
+        eventIndex=buildEventIndex(eventSummary),
+        timeline=buildTimeline(cube),
+    )
+
+
+#Keys telling responses apart: the fingerprint plus how many identical responses came before it, so repeated rows are counted as often as they appear
+def rowKeys(originalDF):
+    fingerprints = originalDF['fingerprint']
+    return pd.MultiIndex.from_arrays([fingerprints.to_numpy(), fingerprints.groupby(fingerprints).cumcount().to_numpy()])
+
+
+#Build the dataset for a newer export of the same form by adding only the responses that aren't in dataset yet.
+#The new rows are paired and folded into the cube on their own, so the work after parsing grows with the new responses rather than the whole history.
+#The result is shared under the new export's hash, so it must hold exactly that export's responses. An export missing any response
+#of dataset isn't a newer version of it and is built in full instead
+def appendResponsesToDataset(dataset, newOriginalDF, contentHash):
+    newKeys = rowKeys(newOriginalDF)
+    oldKeys = rowKeys(dataset['originalDF'])
+    if not oldKeys.isin(newKeys).all():
+        return buildDataset(newOriginalDF, dataset['dateNamePairing'], dataset['pairingVersion'], contentHash)
+
+    isNew = ~newKeys.isin(oldKeys)
+    offset = len(dataset['originalDF'])
+    newRows = newOriginalDF[isNew]
+    newRows.index = pd.RangeIndex(offset, offset + len(newRows))
+    if not len(newRows):
+        return dict(dataset, contentHash=contentHash)
+
+    with stage('pairing'):
+        originalDF = appendRows(dataset['originalDF'], newRows)
+        paired, unknownDates = pairResponses(newRows, dataset['dateNamePairing'])
+        rowsByDate = extendDateIndex(dataset['rowsByDate'], newRows, offset)
+    with stage('revenue'):
+        df = appendRows(dataset['df'], addDerivedColumns(paired))
+    with stage('groupbys'):
+        cube = mergeCubes(dataset['cube'], buildCube(df.iloc[len(dataset['df']):]))
+        eventSummary = buildEventSummary(cube)
+        eventIndex = buildEventIndex(eventSummary)
+        timeline = buildTimeline(cube)
+
+    return dict(
+        dataset,
+        contentHash=contentHash,
+        originalDF=originalDF,
+        rowsByDate=rowsByDate,
+        unknownDates=dataset['unknownDates'] | unknownDates,
+        df=df,
+        cube=cube,
+        eventSummary=eventSummary,
+        eventIndex=eventIndex,
+        timeline=timeline,
+    )
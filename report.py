@@ -0,0 +1,49 @@
+import datetime
+import html
+import os
+
+from aggregates import timeWindow, topEvents
+from charts import TOP_EVENT_PIES, TREND_VALUES, topEventsPie, trendChart
+
+
+#The tables behind every section of the dashboard, as they are written to the CSV summaries
+def reportTables(dataset, years=3, today=None):
+    today = today or datetime.date.today()
+    tables = {'events': dataset['eventSummary'].reset_index()}
+    for chartKey, value, title, valueLabel, memberFlag in TOP_EVENT_PIES:
+        tables[chartKey] = topEvents(dataset['cube'], value, memberFlag=memberFlag)
+    years_ago = today - datetime.timedelta(days=365*years)
+    tables['trend'] = timeWindow(dataset['timeline'], 'Event', False, years_ago)
+    tables['yearly'] = dataset['timeline']['Year', False]
+    return tables
+
+
+#The dashboard charts for a dataset, built by the same functions the dashboard uses
+def reportFigures(dataset, years=3, today=None):
+    today = today or datetime.date.today()
+    figures = [topEventsPie(dataset['cube'], value, title, valueLabel, memberFlag) for _, value, title, valueLabel, memberFlag in TOP_EVENT_PIES]
+    figures += [trendChart(dataset['timeline'], selected_value, years, today) for selected_value in TREND_VALUES]
+    return figures
+
+
+#Write name.html (a standalone page with the plotly library inlined once) and one name-<table>.csv per table into outputDir
+def writeReport(dataset, outputDir, name, years=3, today=None):
+    os.makedirs(outputDir, exist_ok=True)
+    tables = reportTables(dataset, years, today)
+    for tableName, table in tables.items():
+        table.to_csv(os.path.join(outputDir, name + '-' + tableName + '.csv'), index=False)
+
+    charts = [figure.to_html(full_html=False, include_plotlyjs=index == 0) for index, figure in enumerate(reportFigures(dataset, years, today))]
+    events = tables['events'][['eventName', 'date', 'attendees', 'members', 'nonMembers', 'organizations', 'revenue']]
+    page = (
+        '<!DOCTYPE html><html><head><meta charset="utf-8"><title>' + html.escape(name) + '</title></head><body>'
+        + '<h1>Waltham Chamber of Commerce events: ' + html.escape(name) + '</h1>'
+        + '<h2>Information for Specific Events</h2>' + events.to_html(index=False)
+        + '<h2>Top Performing Events</h2>' + ''.join(charts[:len(TOP_EVENT_PIES)])
+        + '<h2>Recent Event Trends</h2>' + ''.join(charts[len(TOP_EVENT_PIES):])
+        + '</body></html>'
+    )
+    path = os.path.join(outputDir, name + '.html')
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(page)
+    return path
@@ -0,0 +1,74 @@
+import pandas as pd
+
+
+#Google Form question headers and the short field names the rest of the app uses for them
+RAW_FIELDS = {
+    'Timestamp': 'date',
+    "Is your organization a sponsor of this event?": 'sponsor',
+    "Is your organization a member of the Waltham Chamber of Commerce?": 'member',
+    "Number of attendees from your company?": 'attendees',
+}
+
+#Compact dtype for each field. Flags stay nullable so a missing or unexpected answer is kept as <NA> instead of turning the column into objects
+FIELD_DTYPES = {
+    'date': 'datetime64[ns]',
+    'sponsor': 'boolean',
+    'member': 'boolean',
+    'attendees': 'Int32',
+    'organization': 'category',
+    'eventName': 'category',
+    'nonMemberPrice': 'float64',
+    'memberPrice': 'float64',
+    'fingerprint': 'uint64',
+}
+
+#Fields a response's fingerprint is computed from. The date is taken with its full submission time, before it is cut down to the day
+FINGERPRINT_FIELDS = ['date', 'organization', 'member', 'sponsor', 'attendees']
+
+
+#Short field name for a raw header. The organization question has been worded differently over the years, so it is matched loosely
+def fieldName(header):
+    if header in RAW_FIELDS:
+        return RAW_FIELDS[header]
+    lowered = str(header).lower()
+    if 'organization' in lowered and 'name' in lowered:
+        return 'organization'
+    return header
+
+
+def renameFields(frame):
+    return frame.rename(columns={header: fieldName(header) for header in frame.columns})
+
+
+#Cast every known field to its compact dtype, leaving any other columns as they are
+def compactFrame(frame):
+    return frame.astype({field: dtype for field, dtype in FIELD_DTYPES.items() if field in frame.columns})
+
+
+#Stable hash of every response, computed from the values rather than their position, so the same row hashes the same in every export
+def rowFingerprints(frame):
+    return pd.util.hash_pandas_object(frame[[field for field in FINGERPRINT_FIELDS if field in frame.columns]], index=False).to_numpy()
+
+
+#Append rows to a compact frame, extending the categories of each categorical field without recoding the rows already there
+def appendRows(frame, newRows):
+    for column in frame.columns:
+        if not isinstance(frame[column].dtype, pd.CategoricalDtype):
+            continue
+        newCategories = newRows[column].cat.categories.difference(frame[column].cat.categories)
+        if len(newCategories):
+            frame = frame.assign(**{column: frame[column].cat.add_categories(newCategories)})
+        newRows = newRows.assign(**{column: newRows[column].cat.set_categories(frame[column].cat.categories)})
+    return pd.concat([frame, newRows])
+
+
+def frameBytes(frame):
+    return int(frame.memory_usage(deep=True).sum())
+
+
+#Human readable before/after memory summary stored alongside a compacted frame
+def memoryReport(frame):
+    report = frame.attrs.get('memory')
+    if not report:
+        return None
+    return f"{report['before'] / 1e6:.2f} MB raw, {report['after'] / 1e6:.2f} MB compacted"
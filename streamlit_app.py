@@ -3,25 +3,55 @@ import pandas as pd
 import numpy as np
 import plotly as pl
 import streamlit as st 
-import plotly.express as px
 import re
-from bs4 import BeautifulSoup
-import requests
-from ics import Calendar, Event
 from datetime import datetime
 import datetime
+import pairing_store
+from aggregates import TIME_BUCKETS, searchEvents
+from charts import MAX_EVENT_OPTIONS, TOP_EVENT_PIES, TREND_VALUES, topEventsPie, trendBucket, trendChart
+from figure_cache import cachedFigure, figureCacheStats
+from pipeline import applyPairingToDataset, buildDataset
+import ingest_jobs
+from calendar_import import importCalendars
+import events_fetcher
+import dataset_registry
+from dataset_registry import datasetKey
+import io
+import json
+import uuid
+from parse_cache import cacheStats, readSourceBytes
+from schema import memoryReport
+import time
+import instrumentation
+from instrumentation import instrumented, stage
 
 
 #Function to add any chart to the page, and account for the click interactivity
-def addChartToPage(fig):
-    #Display the graph
-    st.plotly_chart(fig, on_select="rerun", selection_mode=["points"])
+def addChartToPage(fig, key=None, on_select="rerun"):
+    #Display the graph. Clicking a point only reruns the section the chart is in
+    instrumentation.payload(key or 'chart', lambda: len(pl.io.to_json(fig, validate=False)))
+    with stage('chartRender'):
+        return st.plotly_chart(fig, key=key, on_select=on_select, selection_mode=["points"])
+
+
+#Click handler for the top performer pies: show the clicked event in the "Information for Specific Events" section
+def showEventFromChart(chartKey):
+    points = st.session_state[chartKey]['selection']['points']
+    if points and points[0].get('label') is not None:
+        st.session_state['selectedEvent'] = points[0]['label']
+        st.session_state['drilldownChanged'] = True
 
 
 
 # Configure the default Streamlit page layout - full width with collapsed sidebar
 st.set_page_config(layout="wide", initial_sidebar_state="collapsed")
 
+#Opening the app with ?debug=1 (or starting it with WCC_INSTRUMENT=1) records how long each stage of every rerun takes and shows it in the sidebar
+if st.query_params.get('debug') == '1':
+    st.session_state['debugPanel'] = True
+instrumentation.sessionEnabled = lambda: st.session_state.get('debugPanel', False)
+instrumentation.startRun('page', enabled=instrumentation.ENABLED or instrumentation.sessionEnabled())
+
 #Set a plotly default, which is necessary for the sankey graph to display correctly on streamlit
 pl.io.templates.default = 'plotly'
 
@@ -95,45 +125,29 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-#Initial state to upload the data file
+#Every session gets an id so it can hold a lease on the shared dataset it is looking at
+if 'sessionId' not in st.session_state:
+    st.session_state['sessionId'] = uuid.uuid4().hex
+sessionId = st.session_state['sessionId']
+
+#Initial state to upload the data file. Once processed, the session only keeps the key of the shared dataset, not the file itself
 if 'dataFile' not in st.session_state:
-    st.markdown('<p style="font-size: 20px; ">In order to get started, please add the excel file that contains the correctly formatted Waltham Chamber of Commerce data</p>', unsafe_allow_html=True)
-    uploaded_file = st.file_uploader("In order to get started, please add the excel file that contains the correctly formatted Waltham Chamber of Commerce data", label_visibility="collapsed")
+    st.markdown('<p style="font-size: 20px; ">In order to get started, please add the excel file (or a CSV export of the form) that contains the correctly formatted Waltham Chamber of Commerce data</p>', unsafe_allow_html=True)
+    uploaded_file = st.file_uploader("In order to get started, please add the excel file (or a CSV export of the form) that contains the correctly formatted Waltham Chamber of Commerce data", label_visibility="collapsed", type=["xlsx", "xls", "csv"])
 else:
     uploaded_file = st.session_state['dataFile']
 
 if uploaded_file is None:
     st.session_state['checkFile'] = True
 
-def findPairings(dateRemoved = None):
-    dateNamePairing = st.session_state['dateNamePairing']
-    temp_df = st.session_state['originalDF'].copy()
-    mappingPairs = {}
-    for ind in dateNamePairing.index:
-        mappingPairs[dateNamePairing.loc[ind]['Date']] = dateNamePairing.loc[ind]
-
-    st.session_state['Unknown Dates'] = []
-    eventName = []
-    nonMemberPrice = []
-    memberPrice = []
-    for ind in temp_df.index:
-        date = temp_df.loc[ind]['Timestamp']
-        if date in mappingPairs:
-            eventName.append(mappingPairs[date].iloc[1])
-            nonMemberPrice.append(mappingPairs[date].iloc[2])
-            memberPrice.append(mappingPairs[date].iloc[3])
-        else:
-            if date not in st.session_state['Unknown Dates']:
-                st.session_state['Unknown Dates'].append(date)
-            eventName.append(None)
-            nonMemberPrice.append(None)
-            memberPrice.append(None)
-    temp_df['eventName'] = eventName
-    temp_df['nonMemberPrice'] = nonMemberPrice
-    temp_df['memberPrice'] = memberPrice
-
-    temp_df.dropna(subset=['eventName'], inplace=True)
-    st.session_state['df'] = temp_df
+#While a dataset is shown, a newer file can be uploaded from the sidebar. The current dataset stays up until the new one is ready
+if 'datasetKey' in st.session_state:
+    nextFile = st.sidebar.file_uploader("Upload a newer response file", type=["xlsx", "xls", "csv"], key='nextUpload')
+    appendUpload = st.sidebar.checkbox("It is a newer export of the same form, only add the responses that are new", key='appendUpload')
+    if nextFile is not None and nextFile.file_id != st.session_state.get('nextUploadId'):
+        st.session_state['nextUploadId'] = nextFile.file_id
+        uploaded_file = nextFile
+        st.session_state['checkFile'] = True
 
 
 st.markdown("""
@@ -153,72 +167,248 @@ h3 {
 """, unsafe_allow_html=True)
 
 
+#Save a pairing for one date and publish the next version of the dataset, re-pairing only the responses from that date.
+#Other sessions looking at the previous version keep reading it undisturbed
 def updatePairingFile(date, title, eventMemberPrice, eventNonMemberPrice):
-    currentDF = st.session_state['dateNamePairing']
-    currentDF.loc[len(currentDF)] = [date, title, eventMemberPrice, eventNonMemberPrice]
-    currentDF.to_excel('DateNamePairings.xlsx', index=False)
-    st.session_state['dateNamePairing'] = currentDF
-    findPairings(date)
+    oldKey = st.session_state['datasetKey']
+    current = dataset_registry.get(oldKey, sessionId)
+    pairingVersion = pairing_store.addPairing(date, title, nonMemberPrice=eventNonMemberPrice, memberPrice=eventMemberPrice)
+
+    if pairingVersion == current['pairingVersion'] + 1:
+        build = lambda: applyPairingToDataset(current, date, title, eventNonMemberPrice, eventMemberPrice, pairingVersion)
+    else:
+        #Someone else saved pairings in the meantime, so this version has to be built from the whole pairing table
+        dateNamePairing, pairingVersion = pairing_store.loadPairingTable()
+        build = lambda: buildDataset(current['originalDF'], dateNamePairing, pairingVersion, current['contentHash'])
+
+    newKey = datasetKey(current['contentHash'], pairingVersion)
+    with stage('pairingUpdate'):
+        dataset_registry.publish(oldKey, newKey, sessionId, build)
+    st.session_state['datasetKey'] = newKey
+
+
+#Re-pair the dataset on screen against the latest pairing table, after pairings were added in bulk
+def repairDataset():
+    current = dataset_registry.get(st.session_state['datasetKey'], sessionId) if 'datasetKey' in st.session_state else None
+    if current is None:
+        return
+    oldKey = st.session_state['datasetKey']
+    dateNamePairing, pairingVersion = pairing_store.loadPairingTable()
+    newKey = datasetKey(current['contentHash'], pairingVersion)
+    with stage('pairingUpdate'):
+        dataset_registry.publish(oldKey, newKey, sessionId, lambda: buildDataset(current['originalDF'], dateNamePairing, pairingVersion, current['contentHash']))
+    st.session_state['datasetKey'] = newKey
+
+
+#Add the events of uploaded calendar files to the pairing store in one go, then re-pair the dataset on screen against the new table
+def importCalendarFiles(files):
+    found, added, unpriced, pairingVersion = importCalendars(files)
+    if added:
+        repairDataset()
+    return found, added, unpriced
+
+
+#Each section of the dashboard is a fragment, so changing one of its widgets or clicking one of its charts only reruns that section
+@st.fragment
+@instrumented('specificEventSection')
+def specificEventSection(dataset):
+    st.subheader("Information for Specific Events", anchor="firstSection")  
 
 
-#Process the data file once uploaded
-if uploaded_file is not None and st.session_state['checkFile'] == True:
-    st.session_state['dataFile'] = uploaded_file
+    eventSummary = dataset['eventSummary']
+    if st.session_state.get('selectedEvent') not in eventSummary.index:
+        st.session_state.pop('selectedEvent', None)
+
+    #Every option is sent to the browser on each rerun, so a long history is searched here and only the most recent matches are listed
+    options = list(eventSummary.index)
+    if len(options) > MAX_EVENT_OPTIONS:
+        search = st.text_input("Search for an event", key = 'eventSearch')
+        options = searchEvents(dataset['eventIndex'], search, MAX_EVENT_OPTIONS)
+        #An event picked by clicking a chart stays selected even when it doesn't match the search
+        if st.session_state.get('selectedEvent') is not None and st.session_state['selectedEvent'] not in options:
+            options.insert(0, st.session_state['selectedEvent'])
+        if not options:
+            st.caption("No events match \"" + search + "\"")
+            return
+    instrumentation.payload('selectedEvent', lambda: len(json.dumps(options)))
+    selectedEvent = st.selectbox("What event would you like to learn more about?", options = options, key = 'selectedEvent')
+
+
+
+
+    # Read the precomputed figures for the selected event
+    figures = eventSummary.loc[selectedEvent]
+    dateOfEvent = figures['date']
+
+
+
+    eventName = selectedEvent
+
+    numAttendeesMember = figures['members']
+    numAttendeesNotMember = figures['nonMembers']
+    
+
+    #Counts every response, including the ones without a yes or no membership answer, like the revenue and the reports do
+    numAttendeesTotal = figures['attendees']
+    numAttendeesUnknown = numAttendeesTotal - numAttendeesMember - numAttendeesNotMember
+    attendeeSplit = str(numAttendeesMember) + " members and " + str(numAttendeesNotMember) + " non-members"
+    if numAttendeesUnknown:
+        attendeeSplit = str(numAttendeesMember) + " members, " + str(numAttendeesNotMember) + " non-members and " + str(numAttendeesUnknown) + " who didn't say"
+
+    totalRevenue = f"${int(figures['revenue']):,}"
+    numOfOrganizations = figures['organizations']
+
 
-    #Read the excel file and different sheets, using a faster calamine engine
-    xls = pd.read_excel(uploaded_file, sheet_name=['Form Responses 1'])
 
-    # Access individual sheets using sheet names
-    temp_df = xls['Form Responses 1']
+    st.markdown("<p style='text-align: center; font-size: 3em; font-weight: bold; color: #003478; margin-bottom: 0.5em; line-height: 1.2;'>" + 
+                "At the event, " + eventName + ", which was on " + dateOfEvent.strftime("%B %d, %Y") + ", "+ str(numAttendeesTotal)+" people attended (" + attendeeSplit + "), representing " + str(numOfOrganizations) + " different organizations, and raising " + totalRevenue + " in revenue<p>", unsafe_allow_html=True)
+
 
-    temp_df["Is your organization a sponsor of this event?"] = temp_df["Is your organization a sponsor of this event?"].str.lower().map({'yes': True, 'no': False})
-    temp_df["Is your organization a member of the Waltham Chamber of Commerce?"] = temp_df["Is your organization a member of the Waltham Chamber of Commerce?"].str.lower().map({'yes': True, 'no': False})
-    temp_df['Timestamp'] = pd.to_datetime(temp_df['Timestamp']).dt.date
+@st.fragment
+@instrumented('topPerformersSection')
+def topPerformersSection(dataset):
+    #A fragment can only rerun itself, so after a pie slice was clicked the page reruns once to bring the event section up to date
+    if st.session_state.pop('drilldownChanged', False):
+        st.rerun()
 
-    dateNamePairing = pd.read_excel("DateNamePairings.xlsx", engine = 'calamine', sheet_name=['Sheet1'])['Sheet1']
+    st.subheader("Top Performing Events", anchor="secondSection")  
 
+    dataKey = datasetKey(dataset['contentHash'], dataset['pairingVersion'])
+    cube = dataset['cube']
 
-    dateNamePairing['Date'] = pd.to_datetime(dateNamePairing['Date']).dt.date
+    #Figures are cached per dataset version, so sessions looking at the same data don't rebuild them on every rerun
+    def addPie(chartKey, value, title, valueLabel, memberFlag):
+        pie = cachedFigure(dataKey, 'topEventsPie', (value, memberFlag), lambda: topEventsPie(cube, value, title, valueLabel, memberFlag))
+        addChartToPage(pie, key=chartKey, on_select=lambda: showEventFromChart(chartKey))
 
-    st.session_state['dateNamePairing'] = dateNamePairing
+    pieCol1, pieCol2 = st.columns(2)
+    with pieCol1:
+    # top 5 events by revenue and by attendance
+        for pie in TOP_EVENT_PIES[:2]:
+            addPie(*pie)
+
+    with pieCol2:
+        # top 5 events by members and by non_members
+        for pie in TOP_EVENT_PIES[2:]:
+            addPie(*pie)
+
+
+@st.fragment
+@instrumented('trendsSection')
+def trendsSection(dataset):
+    st.subheader("Recent Event Trends", anchor="thirdSection")  
+    
+    
+    ### trends 
+    # grouped_cost_revenue = df.groupby('eventName').agg({'Cost': 'sum', 'Revenue': 'sum'}).reset_index()
 
+    # scatter_plot_cost = px.scatter(grouped_cost_revenue, 
+    #                       x='Cost', 
+    #                       y='Revenue', 
+    #                       color='eventName', 
+    #                       title='Cost vs. Revenue for Each Event')
     
+    # addChartToPage(scatter_plot_cost)
 
+    
+    years = st.number_input("How many years of data would you like to examine?", min_value=1, value = 3)
+    selected_value = st.selectbox("What type of values would you like to explore?", TREND_VALUES, index=0)
+
+    bucket = st.selectbox("How would you like to group the events?", list(TIME_BUCKETS), index=0)
+    compare = st.checkbox("Compare with the year before", disabled=bucket == 'Event')
+
+    #The window ends today, so the date is part of the cache key
+    today = datetime.date.today()
+    shownBucket = trendBucket(dataset['timeline'], selected_value, years, today, bucket, compare)
+    if shownBucket != bucket:
+        st.caption("There are too many " + ("events" if bucket == 'Event' else bucket.lower() + "s") + " in this window to show one by one, so they are grouped by " + shownBucket.lower())
+    barChart = cachedFigure(
+        datasetKey(dataset['contentHash'], dataset['pairingVersion']),
+        'trendChart',
+        (selected_value, years, today, bucket, compare),
+        lambda: trendChart(dataset['timeline'], selected_value, years, today, bucket, compare),
+    )
+    addChartToPage(barChart, key='trendChart')
+
+
+#Hand the uploaded file to the background ingest workers. The page keeps rendering (including the dataset from an earlier upload) while it is processed
+if uploaded_file is not None and st.session_state['checkFile'] == True:
+    fileName = getattr(uploaded_file, 'name', str(uploaded_file))
+    appendTo = st.session_state.get('datasetKey') if st.session_state.get('appendUpload') else None
+    jobId = ingest_jobs.submit(readSourceBytes(uploaded_file), fileName, sessionId, appendTo)
+    st.session_state.setdefault('ingestJobs', []).append(jobId)
 
+    st.session_state['dataFile'] = fileName
     st.session_state['checkFile'] = False
     st.session_state['currentGraphs'] = []
-    st.session_state['originalDF'] = temp_df
     st.session_state['updatedMissingData'] = False
-    findPairings()
 
-    #Reload the page once everything has been processed so the prompt to input data is removed
+
+#Progress of every upload this session is waiting on, polled every second until they have all finished
+@st.fragment(run_every=1)
+def ingestStatusSection():
+    for jobId in list(st.session_state.get('ingestJobs', [])):
+        job = ingest_jobs.job(jobId)
+        if job is None:
+            st.session_state['ingestJobs'].remove(jobId)
+            continue
+
+        if job['stage'] == 'done':
+            #Switch to the new dataset and let go of the one shown so far
+            oldKey = st.session_state.get('datasetKey')
+            st.session_state['datasetKey'] = job['key']
+            st.session_state['dataFile'] = job['key'][0]
+            if oldKey is not None and oldKey != job['key']:
+                dataset_registry.release(oldKey, sessionId)
+            st.session_state['ingestJobs'].remove(jobId)
+            ingest_jobs.forget(jobId)
+            st.rerun()
+
+        statusCol, cancelCol = st.columns([0.85, 0.15], vertical_alignment="bottom")
+        with statusCol:
+            if job['stage'] in ('failed', 'cancelled'):
+                st.write(":red[" + job['fileName'] + ": " + job['message'] + "]")
+            else:
+                st.progress(job['progress'], text=job['fileName'] + ": " + job['message'])
+        with cancelCol:
+            if job['stage'] in ('failed', 'cancelled'):
+                if st.button("Dismiss", key="dismiss" + jobId):
+                    st.session_state['ingestJobs'].remove(jobId)
+                    ingest_jobs.forget(jobId)
+                    st.rerun()
+            elif st.button("Cancel", key="cancel" + jobId):
+                ingest_jobs.cancel(jobId)
+
+
+#With no upload left to wait for and no dataset to show, go back to the upload prompt
+if 'dataFile' in st.session_state and not st.session_state.get('ingestJobs') and 'datasetKey' not in st.session_state:
+    del st.session_state['dataFile']
     st.rerun()
+
+if st.session_state.get('ingestJobs'):
+    ingestStatusSection()
     
 # print("Website reloaded!")
 
 
 
-#Once the file has been uploaded, this will always run
-if uploaded_file is not None and st.session_state['checkFile'] == False:
-    df = st.session_state['df']
+#Once a dataset has been processed, this will always run
+if 'datasetKey' in st.session_state:
+    dataset = dataset_registry.get(st.session_state['datasetKey'], sessionId)
+    if dataset is None:
+        #The shared dataset was released after this session sat idle for too long, so ask for the file again
+        del st.session_state['datasetKey']
+        st.rerun()
+    df = dataset['df']
     # st.dataframe(df)
-    
-
-    def calculateCost(row):
-        if row['Is your organization a member of the Waltham Chamber of Commerce?']:
-            return row["Number of attendees from your company?"] * row["memberPrice"]
-        else:
-            return row["Number of attendees from your company?"] * row["nonMemberPrice"]
-
-    df['Cost'] = df.apply(calculateCost, axis=1)
 
     if st.session_state['updatedMissingData']:
         st.toast("Information submitted, thank you for updating the data!")
     st.session_state['updatedMissingData'] = False
-    unknownDates = st.session_state['Unknown Dates']
+    unknownDates = dataset['unknownDates']
     if (len(unknownDates) != 0):
         st.write("There are some dates needing updates!")
-        for realDate in unknownDates:
+        for realDate in sorted(unknownDates):
             date = str(realDate)
             with st.form(date):
                 title = st.text_input("If there was an event on " + date + ", please input the name of the event", value = "Event Name Here",key = "Title" + date)
@@ -250,8 +440,7 @@ if uploaded_file is not None and st.session_state['checkFile'] == False:
     # addChartToPage(barChart3)
 
 
-    grouped = df.groupby('eventName').sum(["Is your organization a member of the Waltham Chamber of Commerce?",  'Number of attendees from your company?', "Is your organization a sponsor of this event?", "Cost"])
-    # st.write(grouped)
+    # st.write(cube)
 
 
     # barChart4 = px.bar(grouped, x=grouped.index, y="Cost")
@@ -305,180 +494,82 @@ if uploaded_file is not None and st.session_state['checkFile'] == False:
     
     st.write("")
     st.divider()
-    st.subheader("Information for Specific Events", anchor="firstSection")  
-
-
-    selectedEvent = st.selectbox("What event would you like to learn more about?", options = df.sort_values(by='Timestamp', ascending = False)['eventName'].unique())
-
-
-
-
-    # Calculate the most recent date
-    
-    recent_event = df[df['eventName'] == selectedEvent].reset_index()
-    dateOfEvent = recent_event['Timestamp'].iloc[0]
-
-
-
-    eventName = recent_event[['eventName'][0]][0]
-    groupedData = recent_event.groupby('Is your organization a member of the Waltham Chamber of Commerce?')[['Number of attendees from your company?']].sum().reset_index()
-
-    numAttendeesMember = 0
-    numAttendeesNotMember = 0
-
-    for ind in groupedData.index:
-        if (groupedData['Is your organization a member of the Waltham Chamber of Commerce?'][ind]):
-            numAttendeesMember = groupedData.iloc[ind].iloc[1]
-        else:
-            numAttendeesNotMember = groupedData.iloc[0].iloc[1]
-    
-
-    numAttendeesTotal = numAttendeesMember + numAttendeesNotMember
-
-    totalRevenue = f"${int(recent_event['Cost'].sum()):,}"
-    numOfOrganizations = len(recent_event.index)
-
-
-
-    st.markdown("<p style='text-align: center; font-size: 3em; font-weight: bold; color: #003478; margin-bottom: 0.5em; line-height: 1.2;'>" + 
-                "At the event, " + eventName + ", which was on " + dateOfEvent.strftime("%B %d, %Y") + ", "+ str(numAttendeesTotal)+" people attended (" + str(numAttendeesMember) + " members and " + str(numAttendeesNotMember) + " non-members), representing " + str(numOfOrganizations) + " different organizations, and raising " + totalRevenue + " in revenue<p>", unsafe_allow_html=True)
-
+    specificEventSection(dataset)
 
     st.divider()
+    topPerformersSection(dataset)
 
-    st.subheader("Top Performing Events", anchor="secondSection")  
-
-    pieCol1, pieCol2 = st.columns(2)
-    with pieCol1:
-        # Calculate revenue for each event by multiplying the number of attendees with the respective price
-        df['Revenue'] = df.apply(lambda row: row['Number of attendees from your company?'] * row['memberPrice'] 
-                            if row['Is your organization a member of the Waltham Chamber of Commerce?'] == True 
-                            else row['Number of attendees from your company?'] * row['nonMemberPrice'], axis=1)
-
-    # Group by event name and sum the revenue
-        grouped_revenue = df.groupby('eventName')['Revenue'].sum().reset_index()
-
-    # Sort the events by revenue in descending order and get the top 5
-        top_5_revenue = grouped_revenue.sort_values(by='Revenue', ascending=False).head(5)
-
-    # Create a pie chart for the top 5 events by revenue
-        pie_chart = px.pie(
-            top_5_revenue,
-            names='eventName',
-            values='Revenue',
-            title='Top 5 Events by Revenue',
-            labels={'Revenue': 'Revenue ($)', 'eventName': 'Event Name'},
-        )
-
-        addChartToPage(pie_chart)
-
-
-    # top 5 events by attendance 
-        grouped_attendance = df.groupby('eventName')['Number of attendees from your company?'].sum().reset_index()
-
-        top_5_attendance = grouped_attendance.sort_values(by='Number of attendees from your company?', ascending=False).head(5)
-
-        pie_chart = px.pie(
-            top_5_attendance,
-            names='eventName',
-            values='Number of attendees from your company?',
-            title='Top 5 Events by Attendance',
-            labels={'Number of attendees from your company?': 'Number of Attendees', 'eventName': 'Event Name'},
-        )
-        
-        addChartToPage(pie_chart)
-
-    with pieCol2:
-        # top 5 events by members
-
-        df_members = df[df['Is your organization a member of the Waltham Chamber of Commerce?'] == True]
-
-        grouped_members = df_members.groupby('eventName')['Number of attendees from your company?'].sum().reset_index()
-
-        top_5_members = grouped_members.sort_values(by='Number of attendees from your company?', ascending=False).head(5)
-
-        pie_chart_members = px.pie(
-            top_5_members,
-            names='eventName',
-            values='Number of attendees from your company?',
-            title='Top 5 Events by Members',
-            labels={'Number of attendees from your company?': 'Number of Members', 'eventName': 'Event Name'},
-        )
-        addChartToPage(pie_chart_members)
-
-        # top 5 events by non_members
-        
-        df_non_members = df[df['Is your organization a member of the Waltham Chamber of Commerce?'] == False]
-
-        grouped_non_members = df_non_members.groupby('eventName')['Number of attendees from your company?'].sum().reset_index()
-
-        top_5_members = grouped_non_members.sort_values(by='Number of attendees from your company?', ascending=False).head(5)
-
-        pie_chart_non_members = px.pie(
-            top_5_members,
-            names='eventName',
-            values='Number of attendees from your company?',
-            title='Top 5 Events by Non - Members',
-            labels={'Number of attendees from your company?': 'Number of Non - Members', 'eventName': 'Event Name'},
-        )
-        addChartToPage(pie_chart_non_members)
-    
     st.divider()
-    st.subheader("Recent Event Trends", anchor="thirdSection")  
-    
-    
-    ### trends 
-    # grouped_cost_revenue = df.groupby('eventName').agg({'Cost': 'sum', 'Revenue': 'sum'}).reset_index()
-
-    # scatter_plot_cost = px.scatter(grouped_cost_revenue, 
-    #                       x='Cost', 
-    #                       y='Revenue', 
-    #                       color='eventName', 
-    #                       title='Cost vs. Revenue for Each Event')
-    
-    # addChartToPage(scatter_plot_cost)
-
-    
-    years = st.number_input("How many years of data would you like to examine?", min_value=1, value = 3)
-    selected_value = st.selectbox("What type of values would you like to explore?", ["Total Event Revenue", "Total Attendance Numbers"], index=0)
-
-    
-
-    if selected_value == "Total Event Revenue":
-        grouped3 = df.groupby(['eventName']).agg({'Number of attendees from your company?': 'sum', 'Timestamp': 'first', 'Revenue': 'sum'})
-        grouped3.reset_index(inplace =True)
-        y_axis_years = "Revenue"
-    elif selected_value == "Total Attendance Numbers":
-        grouped3 = df.groupby(["Is your organization a member of the Waltham Chamber of Commerce?", 'eventName']).agg({'Number of attendees from your company?': 'sum', 'Timestamp': 'first', 'Revenue': 'sum'})
-        # grouped3 = df.groupby(["Is your organization a member of the Waltham Chamber of Commerce?", 'eventName']).sum(['Number of attendees from your company?'])
-        grouped3.reset_index(inplace =True)
-        grouped3["Is your organization a member of the Waltham Chamber of Commerce?"] = grouped3["Is your organization a member of the Waltham Chamber of Commerce?"].astype(str).str.lower().map({"true": 'Member', "false": 'Not a Member'})
-        y_axis_years = "Number of attendees from your company?"
-
-
-
-    # Convert the 'date' column to datetime objects
-    grouped3['Timestamp'] = pd.to_datetime(grouped3['Timestamp'])
+    trendsSection(dataset)
+
+if st.sidebar.button("Export pairing table to Excel"):
+    pairingBuffer = io.BytesIO()
+    pairing_store.exportXlsx(pairingBuffer)
+    st.sidebar.download_button("Download DateNamePairings.xlsx", data=pairingBuffer.getvalue(), file_name="DateNamePairings.xlsx")
+
+#A pairing workbook in the DateNamePairings.xlsx layout can be imported back, for pairings that were edited in the spreadsheet
+pairingWorkbook = st.sidebar.file_uploader("Import a pairing table (.xlsx)", type=["xlsx"], key='pairingWorkbook')
+if pairingWorkbook is not None and st.sidebar.button("Import pairing table"):
+    pairing_store.ensureStore()
+    imported, _ = pairing_store.importXlsx(pairingWorkbook)
+    repairDataset()
+    st.session_state['pairingImport'] = f"Imported {imported} pairings. Dates in the workbook replace the pairings they had before"
+    st.rerun()
+if 'pairingImport' in st.session_state:
+    st.sidebar.caption(st.session_state.pop('pairingImport'))
+
+#Events from calendar files are imported all at once, instead of answering one form per unknown date
+calendarFiles = st.sidebar.file_uploader("Import events from calendar files (.ics)", type=["ics"], accept_multiple_files=True, key='calendarFiles')
+if calendarFiles and st.sidebar.button("Import calendar events"):
+    found, added, unpriced = importCalendarFiles(calendarFiles)
+    st.session_state['calendarImport'] = f"Imported {added} of the {found} calendar events. Dates that were already paired were kept"
+    if unpriced:
+        st.session_state['calendarImport'] += f", and {unpriced} events without readable member and non-member prices were left for the form"
+    st.rerun()
+if 'calendarImport' in st.session_state:
+    st.sidebar.caption(st.session_state.pop('calendarImport'))
+
+#Events listed on the chamber's website (the pages in WCC_EVENTS_URLS) are fetched in the background, so reruns never wait on the network
+if events_fetcher.EVENTS_URLS:
+    fetchInfo = events_fetcher.fetchStatus()
+    if st.sidebar.button("Fetch events from the chamber website", disabled=fetchInfo['state'] == 'running'):
+        events_fetcher.startFetch()
+        st.rerun()
+    if fetchInfo['state'] == 'running':
+        st.sidebar.caption(f"Fetching events: {fetchInfo['pages']} pages read, {fetchInfo['added']} new pairings so far")
+    elif fetchInfo['state'] == 'failed':
+        st.sidebar.caption(":red[Fetching events failed: " + fetchInfo['error'] + "]")
+    elif fetchInfo['state'] == 'done':
+        st.sidebar.caption(f"Fetched {fetchInfo['events']} events from {fetchInfo['pages']} pages ({fetchInfo['notModified']} unchanged), {fetchInfo['added']} new pairings")
+        if fetchInfo['unpriced']:
+            st.sidebar.caption(f"{fetchInfo['unpriced']} events without readable member and non-member prices were left for the form")
+        if fetchInfo['failedPages']:
+            st.sidebar.caption(f":red[{fetchInfo['failedPages']} pages could not be fetched or read, see the server log]")
+        if 'datasetKey' in st.session_state and fetchInfo['version'] and st.session_state['datasetKey'][1] < fetchInfo['version']:
+            if st.sidebar.button("Pair the fetched events with the responses"):
+                repairDataset()
+                st.rerun()
+
+cacheInfo = cacheStats()
+st.sidebar.caption(f"Parse cache: {cacheInfo['hits']} hits, {cacheInfo['misses']} misses, {cacheInfo['entries']} entries ({cacheInfo['bytes'] / 1e6:.1f} MB)")
+registryInfo = dataset_registry.registryStats()
+st.sidebar.caption(f"Shared datasets: {registryInfo['datasets']} held by {registryInfo['leases']} sessions")
+figureInfo = figureCacheStats()
+st.sidebar.caption(f"Figure cache: {figureInfo['hits']} hits, {figureInfo['misses']} misses, {figureInfo['figures']} figures ({figureInfo['bytes'] / 1e6:.1f} MB)")
+if 'datasetKey' in st.session_state:
+    sharedDataset = dataset_registry.get(st.session_state['datasetKey'], sessionId)
+    if sharedDataset is not None and memoryReport(sharedDataset['originalDF']):
+        st.sidebar.caption("Responses in memory: " + memoryReport(sharedDataset['originalDF']))
 
-    # Calculate the date one year ago from today
-    years_ago = datetime.datetime.now() - datetime.timedelta(days=365*years)
-    past_years = grouped3[grouped3['Timestamp'] >= years_ago]
-    
-    barChart = px.bar(past_years, x="Timestamp", y=y_axis_years, title = "Revenue From " +str(years) + " Years of Events", hover_data=["eventName"], labels={
-            "Timestamp": "Event Date",
-            "eventName": "Event Name",
-        })
-    if selected_value == "Total Attendance Numbers":
-        barChart = px.bar(past_years, x="Timestamp", color = "Is your organization a member of the Waltham Chamber of Commerce?", y=y_axis_years, title="Attendance by Membership Status", hover_data=["eventName"],
-        labels={
-            "Number of attendees from your company?": "Number of Attendees",
-            "Is your organization a member of the Waltham Chamber of Commerce?": "Membership Status",
-            "Timestamp": "Event Date",
-            "eventName": "Event Name",
-        },)
-
-    barChart.update_traces(width=100000000*years)
-    addChartToPage(barChart)
-    
 st.logo("images/Logo.png")
 
+run = instrumentation.currentRun()
+if run is not None:
+    with st.sidebar.expander("Performance of this run", expanded=True):
+        st.caption(f"Page rerun took {(time.perf_counter() - run['start']) * 1000:.0f} ms. Sections rerun on their own are logged, not shown here")
+        st.dataframe(pd.DataFrame(instrumentation.breakdown(run)), hide_index=True)
+        if run['payloads']:
+            st.caption("Sent to the browser by each chart and list")
+            st.dataframe(pd.DataFrame(instrumentation.payloadBreakdown(run)), hide_index=True)
+instrumentation.finishRun()
+